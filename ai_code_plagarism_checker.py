@@ -51,21 +51,277 @@ from transformers import AutoTokenizer, AutoModel
 import torch
 from tqdm import tqdm
 
-def get_codebert_model():
-    tokenizer = AutoTokenizer.from_pretrained('microsoft/codebert-base')
-    model = AutoModel.from_pretrained('microsoft/codebert-base')
+# A local save_pretrained() copy of microsoft/codebert-base is loaded without hub access
+CODEBERT_MODEL_DIR = os.getenv('CODEBERT_MODEL_DIR', 'microsoft/codebert-base')
+# fp32 (transformers), int8 (dynamically quantized Linear layers), onnx / onnx-int8 (ONNX Runtime)
+CODEBERT_BACKEND = os.getenv('CODEBERT_BACKEND', 'fp32')
+CODEBERT_BACKENDS = ('fp32', 'int8', 'onnx', 'onnx-int8')
+
+def get_codebert_model(model_dir: str = CODEBERT_MODEL_DIR, backend: str = CODEBERT_BACKEND):
+    if backend not in CODEBERT_BACKENDS:
+        raise ValueError(f'Unknown CodeBERT backend {backend!r}, expected one of {CODEBERT_BACKENDS}')
+    local = os.path.isdir(model_dir)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=local)
+    if backend in ('onnx', 'onnx-int8'):
+        model = OnnxCodeBERT.load(model_dir, quantized=backend == 'onnx-int8')
+    else:
+        model = AutoModel.from_pretrained(model_dir, local_files_only=local)
+        model.eval()
+        if backend == 'int8':
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.backend = backend
     return tokenizer, model
 
+def pool_embeddings(last_hidden_state: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+    # Mean over real tokens only (padding would pull short files together),
+    # then L2-normalize so cosine similarity is a plain dot product
+    mask = attention_mask.unsqueeze(-1).to(last_hidden_state.dtype)
+    summed = (last_hidden_state * mask).sum(dim=1)
+    emb = summed / mask.sum(dim=1).clamp(min=1e-9)
+    return torch.nn.functional.normalize(emb, p=2, dim=1)
+
 def get_embedding_batch(texts: list, tokenizer, model) -> torch.Tensor:
     # Batch embedding for speed
     inputs = tokenizer(texts, return_tensors="pt", truncation=True, max_length=512, padding=True)
     with torch.no_grad():
         outputs = model(**inputs)
-        emb = outputs.last_hidden_state.mean(dim=1)
+        emb = pool_embeddings(outputs.last_hidden_state, inputs['attention_mask'])
     return emb
 
+
+# --- ONNX Runtime Backend ---
+from types import SimpleNamespace
+import numpy as np
+
+class _LastHiddenState(torch.nn.Module):
+    # Export wrapper: a plain tensor output and only the inputs the embedding code passes
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+def onnx_model_path(model_dir: str, quantized: bool = False) -> str:
+    # Next to the weights for a local model, under .onnx_models for a hub name
+    base = model_dir if os.path.isdir(model_dir) else os.path.join('.onnx_models', model_dir.replace('/', '--'))
+    return os.path.join(base, 'onnx', 'model-int8.onnx' if quantized else 'model.onnx')
+
+def export_onnx(model_dir: str, quantized: bool = False) -> str:
+    # Export once (and quantize the exported graph for onnx-int8); later loads reuse the file
+    path = onnx_model_path(model_dir, quantized)
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if quantized:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(export_onnx(model_dir), path, weight_type=QuantType.QInt8)
+        return path
+
+    model = AutoModel.from_pretrained(model_dir, local_files_only=os.path.isdir(model_dir))
+    model.eval()
+    # Separate tensors: the exporter merges inputs that are the same object
+    input_ids = torch.ones(1, 8, dtype=torch.long)
+    attention_mask = torch.ones(1, 8, dtype=torch.long)
+    dynamic = {0: 'batch', 1: 'sequence'}
+    torch.onnx.export(
+        _LastHiddenState(model), (input_ids, attention_mask), path,
+        input_names=['input_ids', 'attention_mask'], output_names=['last_hidden_state'],
+        dynamic_axes={'input_ids': dynamic, 'attention_mask': dynamic, 'last_hidden_state': dynamic},
+    )
+    return path
+
+class OnnxCodeBERT:
+    # Stands in for the transformers model: model(input_ids=..., attention_mask=...).last_hidden_state
+    def __init__(self, session):
+        self.session = session
+        self.input_names = [i.name for i in session.get_inputs()]
+
+    @classmethod
+    def load(cls, model_dir: str, quantized: bool = False) -> 'OnnxCodeBERT':
+        import onnxruntime as ort
+        return cls(ort.InferenceSession(export_onnx(model_dir, quantized), providers=['CPUExecutionProvider']))
+
+    def eval(self) -> 'OnnxCodeBERT':
+        return self
+
+    def __call__(self, **inputs) -> SimpleNamespace:
+        feed = {name: inputs[name].numpy().astype(np.int64) for name in self.input_names}
+        hidden = self.session.run(['last_hidden_state'], feed)[0]
+        return SimpleNamespace(last_hidden_state=torch.from_numpy(hidden))
+
+
+# --- Embedding Cache ---
+import hashlib
+
+EMBED_BATCH_SIZE = 32
+EMBEDDING_CACHE_DIR = '.embedding_cache'
+# Part of every cache key: change it whenever the model, truncation or pooling changes
+EMBEDDING_VERSION = 'microsoft/codebert-base:512:masked-mean-l2'
+
+def model_version(model) -> str:
+    # Quantized backends drift slightly from fp32, so each caches separately
+    backend = getattr(model, 'backend', 'fp32')
+    return EMBEDDING_VERSION if backend == 'fp32' else f'{EMBEDDING_VERSION}:{backend}'
+
+def embedding_cache_path(text: str, cache_dir: str, version: str = EMBEDDING_VERSION) -> str:
+    key = hashlib.sha256(f'{version}\n{text}'.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, key[:2], f'{key}.npy')
+
+def load_cached_embedding(path: str):
+    try:
+        return torch.from_numpy(np.load(path))
+    except (OSError, ValueError):
+        return None
+
+def save_cached_embedding(path: str, emb: torch.Tensor) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, emb.numpy())
+    os.replace(tmp_path, path)
+
+def embed_texts(texts: List[str], tokenizer, model, batch_size: int = EMBED_BATCH_SIZE,
+                cache_dir: str = EMBEDDING_CACHE_DIR, num_threads: int = 0) -> torch.Tensor:
+    # Embed texts in bounded mini-batches of similar token length, reusing cached
+    # embeddings of texts seen before; rows come back in the order of texts
+    torch.set_num_threads(num_threads or os.cpu_count() or 1)
+    model.eval()
+
+    paths = [embedding_cache_path(text, cache_dir, model_version(model)) for text in texts]
+    embs: List = [load_cached_embedding(path) if os.path.exists(path) else None for path in paths]
+    missing = [i for i, emb in enumerate(embs) if emb is None]
+    print(f'{len(texts) - len(missing)} embeddings cached, {len(missing)} to compute.')
+
+    if missing:
+        # Sorting by token length keeps padding inside each mini-batch small
+        lengths = tokenizer([texts[i] for i in missing], truncation=True, max_length=512)['input_ids']
+        order = [missing[k] for k in sorted(range(len(missing)), key=lambda k: len(lengths[k]))]
+        for start in tqdm(range(0, len(order), batch_size), desc='Embedding'):
+            batch = order[start:start + batch_size]
+            batch_embs = get_embedding_batch([texts[i] for i in batch], tokenizer, model)
+            for i, emb in zip(batch, batch_embs):
+                embs[i] = emb.clone()
+                save_cached_embedding(paths[i], embs[i])
+
+    return torch.stack(embs)
+
+
+# --- Sliding-Window Embedding ---
+# Token windows per file (room is left for <s> and </s>); consecutive windows share
+# WINDOW_TOKENS - WINDOW_STRIDE tokens so no function is split without also appearing whole
+WINDOW_TOKENS = 510
+WINDOW_STRIDE = 384
+
+def split_windows(text: str, tokenizer, window: int = WINDOW_TOKENS, stride: int = WINDOW_STRIDE) -> List[List[int]]:
+    ids = tokenizer(text, add_special_tokens=False)['input_ids']
+    if len(ids) <= window:
+        return [ids]
+    starts = list(range(0, len(ids) - window, stride)) + [len(ids) - window]
+    return [ids[start:start + window] for start in starts]
+
+def get_window_embedding_batch(windows: List[List[int]], tokenizer, model) -> torch.Tensor:
+    # Like get_embedding_batch, for windows that are already tokenized: <s> ids </s>
+    features = [{'input_ids': [tokenizer.cls_token_id] + ids + [tokenizer.sep_token_id]} for ids in windows]
+    inputs = tokenizer.pad(features, return_tensors="pt", return_attention_mask=True)
+    with torch.no_grad():
+        outputs = model(input_ids=inputs['input_ids'], attention_mask=inputs['attention_mask'])
+        emb = pool_embeddings(outputs.last_hidden_state, inputs['attention_mask'])
+    return emb
+
+def embed_windows(texts: List[str], tokenizer, model, batch_size: int = EMBED_BATCH_SIZE,
+                  cache_dir: str = EMBEDDING_CACHE_DIR, num_threads: int = 0,
+                  window: int = WINDOW_TOKENS, stride: int = WINDOW_STRIDE) -> List[torch.Tensor]:
+    # One (windows x hidden) matrix of unit vectors per text. Windows of all uncached
+    # texts are length-sorted and batched together, so a file that fits in one window
+    # costs the same as in embed_texts
+    torch.set_num_threads(num_threads or os.cpu_count() or 1)
+    model.eval()
+
+    version = f'{model_version(model)}:windows:{window}:{stride}'
+    paths = [embedding_cache_path(text, cache_dir, version) for text in texts]
+    embs: List = [load_cached_embedding(path) if os.path.exists(path) else None for path in paths]
+    missing = [i for i, emb in enumerate(embs) if emb is None]
+
+    windows = [
+        (i, position, ids)
+        for i in missing
+        for position, ids in enumerate(split_windows(texts[i], tokenizer, window, stride))
+    ]
+    print(f'{len(texts) - len(missing)} embeddings cached, {len(missing)} to compute ({len(windows)} windows).')
+
+    if windows:
+        window_embs: Dict[int, Dict[int, torch.Tensor]] = {i: {} for i in missing}
+        # Sorting by token length keeps padding inside each mini-batch small
+        windows.sort(key=lambda item: len(item[2]))
+        for start in tqdm(range(0, len(windows), batch_size), desc='Embedding'):
+            batch = windows[start:start + batch_size]
+            batch_embs = get_window_embedding_batch([ids for _, _, ids in batch], tokenizer, model)
+            for (i, position, _), emb in zip(batch, batch_embs):
+                window_embs[i][position] = emb.clone()
+        for i in missing:
+            embs[i] = torch.stack([window_embs[i][position] for position in sorted(window_embs[i])])
+            save_cached_embedding(paths[i], embs[i])
+
+    return embs
+
+# --- Similarity Search ---
+from typing import Tuple
+
+def find_similar_pairs(unit: np.ndarray, threshold: float, block_size: int = 2048) -> List[Tuple[int, int, float]]:
+    # Cosine similarity above threshold for every i < j, one block_size x block_size
+    # tile at a time, so memory grows with the block size instead of n^2.
+    # Rows must be L2-normalized (pool_embeddings does it), so cosine is a dot product
+    n = unit.shape[0]
+    pairs = []
+    for i0 in range(0, n, block_size):
+        rows = unit[i0:i0 + block_size]
+        # Tiles left of the diagonal only hold j < i pairs
+        for j0 in range(i0, n, block_size):
+            sims = rows @ unit[j0:j0 + block_size].T
+            mask = sims > threshold
+            if j0 == i0:
+                mask = np.triu(mask, k=1)
+            for i, j in np.argwhere(mask):
+                pairs.append((i0 + int(i), j0 + int(j), sims[i, j]))
+    # Same order as walking the full matrix row by row
+    pairs.sort(key=lambda pair: (pair[0], pair[1]))
+    return pairs
+
+def find_similar_files(window_embs: List[torch.Tensor], threshold: float, block_size: int = 2048) -> List[Tuple[int, int, float]]:
+    # Files i < j whose best-matching windows (max-sim over window pairs) exceed threshold.
+    # All windows go through find_similar_pairs at once; with one window per file this
+    # is exactly the file-level search
+    counts = [len(emb) for emb in window_embs]
+    if not counts:
+        return []
+    owners = np.repeat(np.arange(len(window_embs)), counts)
+    window_matrix = torch.cat(window_embs).numpy()
+
+    pairs = find_similar_pairs(window_matrix, threshold, block_size)
+    if not pairs:
+        return []
+    first = owners[np.array([pair[0] for pair in pairs])]
+    second = owners[np.array([pair[1] for pair in pairs])]
+    scores = np.array([pair[2] for pair in pairs], dtype=window_matrix.dtype)
+
+    # Windows are numbered file by file, so first <= second; drop a file's own window pairs
+    keep = first != second
+    first, second, scores = first[keep], second[keep], scores[keep]
+    if not len(scores):
+        return []
+    keys = first * len(window_embs) + second
+    order = np.argsort(keys, kind='stable')
+    keys, scores = keys[order], scores[order]
+    unique_keys, starts = np.unique(keys, return_index=True)
+    best = np.maximum.reduceat(scores, starts)
+    return [(int(key // len(window_embs)), int(key % len(window_embs)), score) for key, score in zip(unique_keys, best)]
+
 import multiprocessing as mp
 
+# --- Fingerprint Matching ---
+from code_fingerprints import FingerprintIndex, format_ranges
+
 def preprocess_file_mp(file):
     return preprocess_file(file)
 
@@ -74,33 +330,59 @@ if __name__ == '__main__':
     files = collect_code_files(folder)
     print(f'Found {len(files)} code files.')
     tokenizer, model = get_codebert_model()
+    print(f'Loaded CodeBERT from {CODEBERT_MODEL_DIR} ({model.backend} backend).')
     # Multiprocessing for preprocessing
     with mp.Pool(processes=mp.cpu_count()) as pool:
         processed_texts = pool.map(preprocess_file_mp, files)
+
+    # Token fingerprints: cheap, catch copied code blocks and say which lines match
+    fingerprint_threshold = 0.5  # Share of the smaller file's fingerprints found in the other
+    fingerprint_prefilter = False  # True sends only fingerprint candidates to CodeBERT
+    starter_folder = None  # Starter code handed out with the assignment; its fingerprints never count
+    fingerprints = FingerprintIndex()
+    for starter_file in collect_code_files(starter_folder) if starter_folder else []:
+        fingerprints.add_boilerplate(preprocess_file(starter_file))
+    for text in processed_texts:
+        fingerprints.add(text)
+    candidates = {(i, j): overlap for i, j, overlap in fingerprints.candidate_pairs(fingerprint_threshold)}
+    print(f'{len(candidates)} file pairs share at least {fingerprint_threshold:.0%} of their fingerprints.')
+    if fingerprint_prefilter:
+        selected = sorted({i for pair in candidates for i in pair})
+    else:
+        selected = list(range(len(files)))
+
     print('Generating embeddings in batch...')
-    batch_embs = get_embedding_batch(processed_texts, tokenizer, model)
-    embeddings: Dict[str, torch.Tensor] = {f: batch_embs[i] for i, f in enumerate(files)}
-    print(f'Generated embeddings for {len(embeddings)} files.')
+    selected_texts = [processed_texts[i] for i in selected]
+    sliding_windows = True  # False compares only each file's first 512 tokens
+    if sliding_windows:
+        window_embs = embed_windows(selected_texts, tokenizer, model)
+    else:
+        window_embs = [emb.unsqueeze(0) for emb in embed_texts(selected_texts, tokenizer, model)]
+    embeddings: Dict[int, torch.Tensor] = {i: window_embs[k] for k, i in enumerate(selected)}
+    print(f'Generated embeddings for {len(embeddings)} files ({sum(len(emb) for emb in window_embs)} windows).')
 
     # --- Similarity Computation ---
-    from sklearn.metrics.pairwise import cosine_similarity
     import pandas as pd
 
     threshold = 0.95  # Stricter threshold
     results = []
-    file_list = list(embeddings.keys())
-    emb_matrix = torch.stack([embeddings[f] for f in file_list]).numpy()
-    sim_matrix = cosine_similarity(emb_matrix)
-
-    for i in range(len(file_list)):
-        for j in range(i+1, len(file_list)):
-            score = sim_matrix[i][j]
-            if score > threshold:
-                results.append({
-                    'File 1': os.path.basename(file_list[i]),
-                    'File 2': os.path.basename(file_list[j]),
-                    'Similarity': round(score, 4)
-                })
+    flagged = {(selected[a], selected[b]): score for a, b, score in find_similar_files(window_embs, threshold)}
+
+    # Pairs flagged by either signal, each with both scores. Matching lines are counted
+    # in the preprocessed code, i.e. without comments and blank lines
+    for i, j in sorted(set(flagged) | set(candidates)):
+        score = flagged.get((i, j))
+        if score is None:
+            score = (embeddings[i] @ embeddings[j].T).max().item()
+        lines_1, lines_2 = fingerprints.matching_lines(i, j)
+        results.append({
+            'File 1': os.path.basename(files[i]),
+            'File 2': os.path.basename(files[j]),
+            'Similarity': round(float(score), 4),
+            'Fingerprint Overlap': round(candidates.get((i, j), fingerprints.similarity(i, j)), 4),
+            'File 1 Lines': format_ranges(lines_1),
+            'File 2 Lines': format_ranges(lines_2),
+        })
 
     # --- Output Report ---
     if results:
@@ -0,0 +1,85 @@
+import argparse
+import os
+import time
+from typing import List, Tuple
+
+import numpy as np
+import torch
+
+from ai_code_plagarism_checker import (
+    CODEBERT_BACKENDS, CODEBERT_MODEL_DIR, EMBED_BATCH_SIZE, collect_code_files, find_similar_pairs,
+    get_codebert_model, get_embedding_batch, preprocess_file,
+)
+
+# Compares CodeBERT inference backends against fp32 on a folder of code files:
+# load time, files/s, per-file embedding drift, and whether the same pairs get flagged.
+#
+#   CODEBERT_MODEL_DIR=models/codebert-base python benchmark_codebert_backends.py submissions
+
+
+def embed_corpus(texts: List[str], tokenizer, model, batch_size: int) -> Tuple[np.ndarray, float]:
+    # Same length-sorted batching as embed_texts, but uncached so every run is measured
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    embs: List = [None] * len(texts)
+    get_embedding_batch(texts[order[0]:order[0] + 1], tokenizer, model)  # warm-up
+    start = time.perf_counter()
+    for offset in range(0, len(order), batch_size):
+        batch = order[offset:offset + batch_size]
+        for i, emb in zip(batch, get_embedding_batch([texts[i] for i in batch], tokenizer, model).numpy()):
+            embs[i] = emb
+    return np.stack(embs), time.perf_counter() - start
+
+def flagged_pairs(embs: np.ndarray, threshold: float) -> set:
+    return {(i, j) for i, j, _ in find_similar_pairs(embs, threshold)}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CodeBERT inference backends against fp32')
+    parser.add_argument('corpus', help='Folder of code files (.py, .c, .cpp, .java)')
+    parser.add_argument('--model-dir', default=CODEBERT_MODEL_DIR)
+    parser.add_argument('--backends', nargs='+', default=list(CODEBERT_BACKENDS[1:]), choices=CODEBERT_BACKENDS)
+    parser.add_argument('--batch-size', type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument('--threshold', type=float, default=0.95)
+    parser.add_argument('--threads', type=int, default=0)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads or os.cpu_count() or 1)
+    files = collect_code_files(args.corpus)
+    if not files:
+        parser.error(f'No code files found in {args.corpus}')
+    texts = [preprocess_file(f) for f in files]
+    print(f'{len(files)} files, batch size {args.batch_size}, {torch.get_num_threads()} threads\n')
+
+    reference = None
+    rows = []
+    for backend in ['fp32'] + [b for b in args.backends if b != 'fp32']:
+        start = time.perf_counter()
+        tokenizer, model = get_codebert_model(args.model_dir, backend)
+        load_seconds = time.perf_counter() - start
+        embs, seconds = embed_corpus(texts, tokenizer, model, args.batch_size)
+        row = {'backend': backend, 'load_s': load_seconds, 'files_per_s': len(texts) / seconds}
+
+        if reference is None:
+            reference, reference_pairs = embs, flagged_pairs(embs, args.threshold)
+            row['speedup'] = 1.0
+        else:
+            # Rows are unit vectors, so the row-wise dot product is the cosine to fp32
+            cosine = np.einsum('ij,ij->i', embs, reference)
+            pairs = flagged_pairs(embs, args.threshold)
+            union = pairs | reference_pairs
+            row.update({
+                'speedup': row['files_per_s'] / rows[0]['files_per_s'],
+                'mean_cos': float(cosine.mean()),
+                'min_cos': float(cosine.min()),
+                'pair_agreement': len(pairs & reference_pairs) / len(union) if union else 1.0,
+            })
+        rows.append(row)
+
+    print(f"{'backend':<10} {'load s':>7} {'files/s':>9} {'speedup':>8} {'mean cos':>9} {'min cos':>8} {'pairs':>6}")
+    for row in rows:
+        drift = (f"{row['mean_cos']:>9.5f} {row['min_cos']:>8.5f} {row['pair_agreement']:>6.1%}"
+                 if 'mean_cos' in row else f"{'-':>9} {'-':>8} {'-':>6}")
+        print(f"{row['backend']:<10} {row['load_s']:>7.2f} {row['files_per_s']:>9.1f} {row['speedup']:>7.2f}x {drift}")
+    print(f'\npairs: overlap of pairs flagged at {args.threshold} with fp32 (intersection over union)')
+
+if __name__ == '__main__':
+    main()
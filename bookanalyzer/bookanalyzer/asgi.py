@@ -3,6 +3,10 @@ ASGI config for bookanalyzer project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve through this module (e.g. ``uvicorn bookanalyzer.asgi:application``) so
+that streaming endpoints such as ``ask-question/stream/`` flush server-sent
+events as they are produced.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -81,6 +81,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Index workers write job progress while requests read it
+        'OPTIONS': {'timeout': 20},
     }
 }
 
@@ -139,5 +141,29 @@ REST_FRAMEWORK = {
     ]
 }
 
+# Build the shared services (books.services.registry) when the app loads
+WARM_SERVICES = True
+
+# Background PDF indexing (books.services.indexing_jobs)
+# Worker threads started inside each web process; set to 0 when running
+# `python manage.py run_index_worker` as a separate process instead.
+INDEXING_WORKERS = 2
+INDEXING_MAX_ATTEMPTS = 3
+INDEXING_STALE_SECONDS = 300
+
+# Answer cache for ask_question (books.services.answer_cache)
+ANSWER_CACHE_TTL_SECONDS = 7 * 24 * 3600
+# Cosine similarity for near-duplicate questions (e.g. 0.92); None for exact matches only
+ANSWER_CACHE_SIMILARITY = None
+
+# Online PDF search results per (title, author) (books.services.enhanced_book_finder)
+BOOK_LOOKUP_TTL_SECONDS = 30 * 24 * 3600
+BOOK_LOOKUP_NEGATIVE_TTL_SECONDS = 24 * 3600
+
+# analyze_code results per normalized snippet (books.services.code_analysis_cache)
+CODE_ANALYSIS_CACHE_TTL_SECONDS = 30 * 24 * 3600
+# Least recently used results beyond this many are deleted
+CODE_ANALYSIS_CACHE_MAX_ENTRIES = 10000
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Book, Chat
+from .models import Book, BookLookup, Chat, CodeAnalysis, IndexJob
 
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
@@ -13,3 +13,19 @@ class ChatAdmin(admin.ModelAdmin):
     list_display = ['book', 'question', 'created_at']
     list_filter = ['created_at']
     search_fields = ['question', 'answer']
+
+@admin.register(IndexJob)
+class IndexJobAdmin(admin.ModelAdmin):
+    list_display = ['book', 'kind', 'state', 'pages_done', 'pages_total', 'attempts', 'created_at']
+    list_filter = ['state', 'kind']
+    readonly_fields = ['created_at', 'updated_at', 'heartbeat_at']
+
+@admin.register(BookLookup)
+class BookLookupAdmin(admin.ModelAdmin):
+    list_display = ['title_key', 'author_key', 'pdf_url', 'expires_at']
+    search_fields = ['title_key', 'author_key']
+
+@admin.register(CodeAnalysis)
+class CodeAnalysisAdmin(admin.ModelAdmin):
+    list_display = ['code_hash', 'hits', 'created_at', 'last_used_at']
+    readonly_fields = ['created_at', 'last_used_at']
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class BooksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'books'
+
+    def ready(self):
+        from django.conf import settings
+
+        from books import signals  # noqa: F401
+        from books.services.registry import registry
+
+        # Build the shared Gemini clients once per process instead of per request
+        if getattr(settings, 'WARM_SERVICES', True):
+            registry.warm_up()
@@ -0,0 +1,158 @@
+import json
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from books.management.commands.train_code_detector import read_code_files
+from books.services.ai_code_plagiarism_checker import AICodePlagiarismChecker
+from books.services.code_analysis_cache import CodeAnalysisCache
+from books.services.code_stylometry import LocalCodeDetector, extract_features
+from books.services.concurrency import RateLimiter
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class SimulatedGemini:
+    """Stands in for Gemini with a fixed latency so runs cost no quota"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def generate_content(self, prompt, request_options=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        return _Response('{"ai_probability": 50, "human_probability": 50, "confidence": 50}')
+
+
+def synthetic_snippets(count, seed=0):
+    """Labelled toy snippets in two styles, for when no corpus is given"""
+    rng = random.Random(seed)
+    names = ['total', 'items', 'result', 'value', 'index', 'count', 'data', 'buffer']
+    snippets = []
+    for i in range(count):
+        a, b = rng.sample(names, 2)
+        if i % 2:
+            snippets.append((1, (
+                f"def calculate_{a}_{b}({a}_list):\n"
+                f'    """Calculate the {a} of the given {b} values."""\n'
+                f"    # Initialize the accumulator\n"
+                f"    {a}_sum = 0\n"
+                f"    for {b}_item in {a}_list:\n"
+                f"        {a}_sum += {b}_item * {rng.randint(2, 9)}\n"
+                f"    return {a}_sum\n"
+            )))
+        else:
+            snippets.append((0, (
+                f"def f{i}(x,y):\n"
+                f"  t=0 \n"
+                f"  for k in x:t+=k*{rng.randint(2, 9)}\n"
+                f"  if y: print(t)   \n"
+                f"  return t\n"
+            )))
+    return snippets
+
+
+def _latency_summary(seconds):
+    seconds = np.asarray(seconds)
+    return (
+        f"p50 {np.percentile(seconds, 50) * 1000:.3f} ms, p95 {np.percentile(seconds, 95) * 1000:.3f} ms, "
+        f"{len(seconds) / seconds.sum():.0f} snippets/s"
+    )
+
+
+class Command(BaseCommand):
+    help = "Measure per-snippet latency and throughput of the local, cache and LLM tiers of analyze_code"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ai-dir', help="Labelled corpus; synthetic snippets are used without it")
+        parser.add_argument('--human-dir')
+        parser.add_argument('--count', type=int, default=200, help="Synthetic snippets to generate")
+        parser.add_argument('--llm-latency', type=float, default=0.8,
+                            help="Simulated Gemini round-trip in seconds")
+        parser.add_argument('--confidence', type=float, default=None)
+        parser.add_argument('--train-fraction', type=float, default=0.5,
+                            help="Share of the corpus used to train a throwaway detector when none is trained")
+
+    def handle(self, *args, **options):
+        corpus = bool(options['ai_dir'] and options['human_dir'])
+        if corpus:
+            labelled = [(1, code) for code in read_code_files(options['ai_dir'])]
+            labelled += [(0, code) for code in read_code_files(options['human_dir'])]
+        else:
+            labelled = synthetic_snippets(options['count'])
+        random.Random(1).shuffle(labelled)
+
+        detector = LocalCodeDetector.load()
+        trained = detector.available
+        if not trained:
+            # Measured snippets must be unseen, or the local tier answers all of them
+            split = min(max(int(len(labelled) * options['train_fraction']), 2), len(labelled) - 1)
+            train, labelled = labelled[:split], labelled[split:]
+            self.stdout.write(
+                f"No trained detector found; training a throwaway one on {len(train)} snippets, "
+                f"measuring the {len(labelled)} held out"
+            )
+            detector = LocalCodeDetector.train([code for _, code in train], [label for label, _ in train])
+        codes = [code for _, code in labelled]
+
+        self.stdout.write(f"{len(codes)} snippets, simulated LLM latency {options['llm_latency']}s")
+        self.stdout.write(f"features: {self._time_each(extract_features, codes)}")
+        self.stdout.write(f"local:    {self._time_each(detector.score, codes)}")
+        self.stdout.write(f"cache:    {self._cache_tier(codes)}")
+
+        llm_codes = codes[:max(1, min(len(codes), int(5 / max(options['llm_latency'], 0.001))))]
+        llm_only = self._checker(options, None)
+        self.stdout.write(f"llm:      {self._time_each(llm_only.analyze_code, llm_codes)}")
+
+        if not corpus and not trained:
+            # The two synthetic styles are trivially separable, so a local share
+            # measured on them says nothing about real traffic
+            self.stdout.write("tiered:   skipped; needs a trained detector or --ai-dir/--human-dir")
+            return
+
+        tiered = self._checker(options, detector)
+        tiers = []
+        started = time.perf_counter()
+        latencies = []
+        for code in codes:
+            start = time.perf_counter()
+            tiers.append(tiered.analyze_code(code).get('tier'))
+            latencies.append(time.perf_counter() - start)
+        elapsed = time.perf_counter() - started
+        local_share = tiers.count('local') / len(tiers)
+        self.stdout.write(
+            f"tiered:   {_latency_summary(latencies)}; {local_share:.1%} answered locally, "
+            f"{tiered.model.calls} LLM calls for {len(codes)} snippets in {elapsed:.1f}s"
+        )
+
+    def _checker(self, options, detector):
+        return AICodePlagiarismChecker(
+            model=SimulatedGemini(options['llm_latency']), rate_limiter=RateLimiter(0),
+            local_detector=detector, local_confidence=options['confidence'],
+        )
+
+    def _time_each(self, function, codes):
+        latencies = []
+        for code in codes:
+            start = time.perf_counter()
+            function(code)
+            latencies.append(time.perf_counter() - start)
+        return _latency_summary(latencies)
+
+    def _cache_tier(self, codes):
+        """Cache hits against the real database, rolled back afterwards"""
+        cache = CodeAnalysisCache(max_entries=len(codes) + 1)
+        result = json.loads(SimulatedGemini(0).generate_content('').text)
+        with transaction.atomic():
+            for code in codes:
+                cache.put(code, result)
+            summary = self._time_each(cache.get, codes)
+            transaction.set_rollback(True)
+        return summary
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from books.models import Book, IndexedDocument
+from books.services.bulk_indexing import index_pdf, init_worker
+from books.services.document_store import hash_file, mark_document_indexed
+
+
+class Checkpoint:
+    """JSON record of each file's book and whether its index is built, so a rerun resumes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def get(self, pdf_path):
+        return self.entries.get(pdf_path, {})
+
+    def update(self, pdf_path, **fields):
+        self.entries.setdefault(pdf_path, {}).update(fields)
+
+    def is_done(self, pdf_path):
+        return self.get(pdf_path).get('state') in ('done', 'skipped')
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+
+class Command(BaseCommand):
+    help = "Index every PDF under a directory using a process pool; rerun to resume after a crash"
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--author', default='Unknown')
+        parser.add_argument('--batch-size', type=int, default=500, help="Books per bulk insert")
+        parser.add_argument('--checkpoint', help="Defaults to media/bulk_ingest_<dir hash>.json")
+
+    def handle(self, *args, **options):
+        directory = os.path.abspath(options['directory'])
+        if not os.path.isdir(directory):
+            raise CommandError(f"Not a directory: {directory}")
+        workers = max(options['workers'], 1)
+
+        checkpoint_path = options['checkpoint']
+        if not checkpoint_path:
+            os.makedirs('media', exist_ok=True)
+            dir_hash = hashlib.sha1(directory.encode()).hexdigest()[:12]
+            checkpoint_path = f"media/bulk_ingest_{dir_hash}.json"
+        checkpoint = Checkpoint(checkpoint_path)
+
+        pdf_paths = sorted(
+            os.path.join(root, filename)
+            for root, _, filenames in os.walk(directory)
+            for filename in filenames
+            if filename.lower().endswith('.pdf')
+        )
+        pending = [path for path in pdf_paths if not checkpoint.is_done(path)]
+        self.stdout.write(
+            f"{len(pdf_paths)} PDFs found, {len(pdf_paths) - len(pending)} already done, "
+            f"{len(pending)} to process with {workers} workers"
+        )
+        if not pending:
+            return
+
+        hashes = self._hash_files(pending, checkpoint, workers)
+        checkpoint.save()
+        builds = self._create_books(hashes, checkpoint, options)
+        checkpoint.save()
+        if not builds:
+            return
+
+        # Forked workers must not inherit the parent's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            self._build_indexes(pool, builds, checkpoint)
+
+    def _hash_files(self, pdf_paths, checkpoint, workers):
+        """SHA-256 of each file, reusing the checkpoint's when the file is unchanged"""
+        hashes = {}
+        to_hash = []
+        for path in pdf_paths:
+            entry = checkpoint.get(path)
+            stat = os.stat(path)
+            if entry.get('sha256') and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime:
+                hashes[path] = entry['sha256']
+            else:
+                to_hash.append(path)
+
+        # hashlib releases the GIL on large buffers, so threads hash in parallel
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            file_hashes = list(pool.map(hash_file, to_hash))
+        for path, sha256 in zip(to_hash, file_hashes):
+            stat = os.stat(path)
+            checkpoint.update(path, sha256=sha256, size=stat.st_size, mtime=stat.st_mtime)
+            hashes[path] = sha256
+        return hashes
+
+    def _create_books(self, hashes, checkpoint, options):
+        """Create the missing Book rows in bulk; returns {sha256: (document, pdf_path)} left to index"""
+        shas = set(hashes.values())
+        IndexedDocument.objects.bulk_create(
+            [IndexedDocument(sha256=sha256) for sha256 in shas], ignore_conflicts=True
+        )
+        documents = {document.sha256: document for document in IndexedDocument.objects.filter(sha256__in=shas)}
+        resumed_ids = {
+            checkpoint.get(path).get('book_id') for path in hashes if checkpoint.get(path).get('book_id')
+        }
+        existing_books = set(Book.objects.filter(id__in=resumed_ids).values_list('id', flat=True))
+        # Documents some other book already uses, e.g. from an earlier upload
+        known_documents = set(
+            Book.objects.filter(document__sha256__in=shas)
+            .exclude(id__in=existing_books)
+            .values_list('document__sha256', flat=True)
+        )
+
+        builds = {}
+        new_books = []
+        skipped = 0
+        for path, sha256 in hashes.items():
+            document = documents[sha256]
+            book_id = checkpoint.get(path).get('book_id')
+            if book_id in existing_books:
+                # Created by an interrupted run; only its index is missing
+                builds.setdefault(sha256, (document, path))
+            elif sha256 in builds or (document.is_indexed and sha256 in known_documents):
+                checkpoint.update(path, state='skipped')
+                skipped += 1
+            else:
+                title = os.path.splitext(os.path.basename(path))[0].replace('_', ' ')
+                new_books.append((path, Book(title=title, author=options['author'], document=document)))
+                builds[sha256] = (document, path)
+
+        for start in range(0, len(new_books), options['batch_size']):
+            batch = new_books[start:start + options['batch_size']]
+            # Saved before the rows commit: after a crash the checkpoint never
+            # misses a book that exists (a rerun would create it twice); an id
+            # whose row never committed is simply created again
+            with transaction.atomic():
+                Book.objects.bulk_create([book for _, book in batch])
+                for path, book in batch:
+                    checkpoint.update(path, book_id=book.id, state='created')
+                checkpoint.save()
+
+        if skipped:
+            self.stdout.write(f"♻️ Skipped {skipped} files whose content is already in the library")
+        self.stdout.write(f"Created {len(new_books)} books, {len(builds)} indexes to build")
+
+        # Indexed documents only needed their book row
+        for sha256, (document, path) in list(builds.items()):
+            if document.is_indexed:
+                mark_document_indexed(document)
+                self._mark_done(checkpoint, hashes, sha256)
+                del builds[sha256]
+        return builds
+
+    def _build_indexes(self, pool, builds, checkpoint):
+        hashes = {path: entry.get('sha256') for path, entry in checkpoint.entries.items()}
+        futures = {
+            pool.submit(index_pdf, document.index_key, path): (sha256, document, path)
+            for sha256, (document, path) in builds.items()
+        }
+
+        started = time.monotonic()
+        done = failed = pages = 0
+        for future in as_completed(futures):
+            sha256, document, path = futures[future]
+            try:
+                success, page_count = future.result()
+            except Exception as e:
+                print(f"Index worker error: {e}")
+                success, page_count = False, 0
+
+            name = os.path.basename(path)
+            if success:
+                mark_document_indexed(document)
+                self._mark_done(checkpoint, hashes, sha256)
+                done += 1
+                pages += page_count
+                status = f"✅ {name} ({page_count} pages)"
+            else:
+                failed += 1
+                status = f"❌ Failed to process: {name}"
+            checkpoint.save()
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"[{done + failed}/{len(futures)}] {status} - "
+                f"{(done + failed) / elapsed * 60:.1f} files/min, {pages / elapsed:.1f} pages/s"
+            )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"Indexed {done} PDFs ({pages} pages) in {elapsed:.1f}s, {failed} failed")
+        if failed:
+            self.stdout.write("Rerun the command to retry the failed files")
+
+    def _mark_done(self, checkpoint, hashes, sha256):
+        """Every file with this content shares the index that was just built"""
+        for path, file_sha in hashes.items():
+            if file_sha == sha256 and checkpoint.get(path).get('state') == 'created':
+                checkpoint.update(path, state='done')
@@ -0,0 +1,31 @@
+import glob
+import os
+
+from django.core.management.base import BaseCommand
+
+from books.services.chunk_store import convert_pickle_store
+
+
+class Command(BaseCommand):
+    help = "Convert legacy pickled chunk files in media/indexes/ to memory-mapped chunk stores"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--index-dir', default='media/indexes')
+        parser.add_argument('--keep', action='store_true', help="Keep the .pkl files after converting")
+
+    def handle(self, *args, **options):
+        converted = 0
+        for pkl_path in sorted(glob.glob(os.path.join(options['index_dir'], 'book_*_chunks.pkl'))):
+            store_path = pkl_path[:-len('_chunks.pkl')] + '.chunks'
+            try:
+                count = convert_pickle_store(pkl_path, store_path)
+            except Exception as e:
+                self.stderr.write(f"❌ {pkl_path}: {e}")
+                continue
+
+            if not options['keep']:
+                os.unlink(pkl_path)
+            converted += 1
+            self.stdout.write(f"✅ {pkl_path} -> {store_path} ({count} chunks)")
+
+        self.stdout.write(f"Converted {converted} chunk files")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from books.services.indexing_jobs import IndexingWorkerPool, recover_stale_jobs
+
+
+class Command(BaseCommand):
+    help = "Process queued PDF indexing jobs until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--poll-interval', type=float, default=2.0)
+
+    def handle(self, *args, **options):
+        requeued, failed = recover_stale_jobs()
+        self.stdout.write(f"Recovered {requeued} interrupted jobs ({failed} out of attempts)")
+        self.stdout.write(f"Starting {options['workers']} index workers, Ctrl+C to stop")
+        IndexingWorkerPool(workers=options['workers'], poll_interval=options['poll_interval']).run_forever()
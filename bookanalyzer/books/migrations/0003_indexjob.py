@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_alter_book_author'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('pdf', 'Index uploaded PDF'), ('search', 'Search online, download and index')], default='pdf', max_length=20)),
+                ('pdf_path', models.CharField(blank=True, max_length=500)),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=20)),
+                ('pages_done', models.IntegerField(default=0)),
+                ('pages_total', models.IntegerField(default=0)),
+                ('attempts', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('worker_id', models.CharField(blank=True, max_length=100)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='index_jobs', to='books.book')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
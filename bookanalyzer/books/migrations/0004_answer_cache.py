@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_indexjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='indexed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='from_cache',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='normalized_question',
+            field=models.CharField(blank=True, db_index=True, max_length=500),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_answer_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookLookup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title_key', models.CharField(max_length=255)),
+                ('author_key', models.CharField(max_length=255)),
+                ('pdf_url', models.URLField(blank=True, max_length=1000)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('title_key', 'author_key'), name='unique_book_lookup')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_booklookup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexedDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('is_indexed', models.BooleanField(default=False)),
+                ('indexed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='document',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='books', to='books.indexeddocument'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_codeanalysis'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='document',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chats', to='books.indexeddocument'),
+        ),
+    ]
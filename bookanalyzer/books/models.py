@@ -1,6 +1,20 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+class IndexedDocument(models.Model):
+    """A PDF's index, shared by every book uploaded with the same bytes"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    is_indexed = models.BooleanField(default=False)
+    indexed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def index_key(self):
+        return f"doc_{self.sha256}"
+
+    def __str__(self):
+        return self.sha256[:12]
+
 class Book(models.Model):
     title = models.CharField(max_length=255)
     author = models.CharField(max_length=255, blank=True, default='Unknown')
@@ -8,17 +22,98 @@ class Book(models.Model):
     pdf_file = models.FileField(upload_to='pdfs/', blank=True)
     extracted_text = models.TextField(blank=True)
     is_indexed = models.BooleanField(default=False)
+    # Set whenever the index is (re)built; answers cached before it are stale
+    indexed_at = models.DateTimeField(null=True, blank=True)
+    # Shared content-addressed index; books indexed before dedup have none
+    document = models.ForeignKey(IndexedDocument, on_delete=models.PROTECT, null=True, blank=True, related_name='books')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
 
+    @property
+    def index_key(self):
+        """Key of this book's index files in PDFQAService"""
+        return self.document.index_key if self.document_id else self.id
+
 class Chat(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='chats')
     question = models.TextField()
+    # Lookup key for the answer cache; blank for answers that must not be reused
+    normalized_question = models.CharField(max_length=500, blank=True, db_index=True)
+    # Index the answer came from; answers about a book's earlier PDF are never reused
+    document = models.ForeignKey(IndexedDocument, on_delete=models.SET_NULL, null=True, blank=True, related_name='chats')
     answer = models.TextField()
+    from_cache = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+
+class IndexJob(models.Model):
+    """A queued PDF indexing run, processed by books.services.indexing_jobs"""
+    KIND_PDF = 'pdf'
+    KIND_SEARCH = 'search'
+    KIND_CHOICES = [
+        (KIND_PDF, 'Index uploaded PDF'),
+        (KIND_SEARCH, 'Search online, download and index'),
+    ]
+
+    STATE_QUEUED = 'queued'
+    STATE_RUNNING = 'running'
+    STATE_DONE = 'done'
+    STATE_FAILED = 'failed'
+    STATE_CHOICES = [
+        (STATE_QUEUED, 'Queued'),
+        (STATE_RUNNING, 'Running'),
+        (STATE_DONE, 'Done'),
+        (STATE_FAILED, 'Failed'),
+    ]
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='index_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=KIND_PDF)
+    pdf_path = models.CharField(max_length=500, blank=True)
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default=STATE_QUEUED, db_index=True)
+    pages_done = models.IntegerField(default=0)
+    pages_total = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    worker_id = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.book} ({self.state})"
+
+class BookLookup(models.Model):
+    """Cached outcome of an online PDF search; a blank pdf_url records 'not found'"""
+    title_key = models.CharField(max_length=255)
+    author_key = models.CharField(max_length=255)
+    pdf_url = models.URLField(max_length=1000, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['title_key', 'author_key'], name='unique_book_lookup'),
+        ]
+
+    def __str__(self):
+        return f"{self.title_key} / {self.author_key}: {self.pdf_url or 'not found'}"
+
+
+class CodeAnalysis(models.Model):
+    """Cached analyze_code result, keyed by the hash of the normalized code"""
+    code_hash = models.CharField(max_length=64, unique=True)
+    result = models.JSONField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.code_hash[:12]} ({self.hits} hits)"
@@ -1,12 +1,50 @@
 import google.generativeai as genai
+import json
 import os
-import re
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from books.services.chunking import estimate_tokens
+from books.services.code_stylometry import code_stats
+from books.services.concurrency import RateLimiter
+
 load_dotenv()
 
+# Snippets analyzed at once by batch_analyze
+MAX_CONCURRENCY = int(os.getenv('PLAGIARISM_MAX_CONCURRENCY', 8))
+# Seconds before a single Gemini call is abandoned
+REQUEST_TIMEOUT = float(os.getenv('PLAGIARISM_REQUEST_TIMEOUT', 30))
+# Client-side cap on Gemini calls, shared by every checker in the process (0 disables it)
+REQUESTS_PER_MINUTE = float(os.getenv('GEMINI_REQUESTS_PER_MINUTE', 300))
+
+# Estimated prompt tokens of code packed into one request by batch_analyze (0 disables packing)
+PACK_TOKEN_BUDGET = int(os.getenv('PLAGIARISM_PACK_TOKENS', 6000))
+# Most snippets per packed request, which bounds the size of the JSON array returned
+PACK_MAX_SNIPPETS = int(os.getenv('PLAGIARISM_PACK_MAX_SNIPPETS', 10))
+MIN_CODE_LENGTH = 10
+# Local-tier verdicts at least this sure are returned without asking Gemini
+LOCAL_CONFIDENCE = float(os.getenv('LOCAL_DETECTOR_CONFIDENCE', 0.9))
+
+gemini_rate_limiter = RateLimiter(60.0 / REQUESTS_PER_MINUTE if REQUESTS_PER_MINUTE > 0 else 0)
+
+
 class AICodePlagiarismChecker:
-    def __init__(self):
+    def __init__(self, model=None, max_concurrency=None, request_timeout=None, rate_limiter=None,
+                 pack_token_budget=None, cache=None, local_detector=None, local_confidence=None):
+        """model may be any object with Gemini's generate_content(prompt, request_options=...);
+        cache (a CodeAnalysisCache) and local_detector (a LocalCodeDetector), if given, are
+        consulted in that order before calling it."""
+        self.cache = cache
+        self.local_detector = local_detector
+        self.local_confidence = local_confidence or LOCAL_CONFIDENCE
+        self.max_concurrency = max_concurrency or MAX_CONCURRENCY
+        self.request_timeout = request_timeout or REQUEST_TIMEOUT
+        self.rate_limiter = rate_limiter or gemini_rate_limiter
+        self.pack_token_budget = PACK_TOKEN_BUDGET if pack_token_budget is None else pack_token_budget
+        if model is not None:
+            self.model = model
+            return
+
         try:
             api_key = os.getenv('GEMINI_API_KEY')
             if not api_key:
@@ -19,17 +57,22 @@ class AICodePlagiarismChecker:
 
     def analyze_code(self, code):
         """Analyze code to determine if it's AI-generated or human-written"""
+        if self._too_short(code):
+            return self._too_short_result()
+        cached = self._cached_result(code) or self._local_result(code)
+        if cached:
+            return cached
+        return self._store(code, self._analyze(code))
+
+    def _analyze(self, code):
+        """One Gemini analysis of code, bypassing the cache"""
         try:
             if not self.model:
                 raise Exception("Gemini model not initialized")
 
             # Clean and validate code
-            if not code or len(code.strip()) < 10:
-                return {
-                    'error': 'Code too short for analysis (minimum 10 characters)',
-                    'ai_probability': 0,
-                    'human_probability': 0
-                }
+            if self._too_short(code):
+                return self._too_short_result()
 
             prompt = f"""
             Analyze the following code and determine if it was written by AI or a human programmer.
@@ -60,43 +103,11 @@ class AICodePlagiarismChecker:
             }}
             """
 
-            response = self.model.generate_content(prompt)
-            result = response.text.strip()
-
-            # Clean up response
-            if '```json' in result:
-                result = result.split('```json')[1].split('```')[0].strip()
-            elif '```' in result:
-                result = result.split('```')[1].split('```')[0].strip()
+            response = self._generate(prompt)
 
             # Parse JSON response
-            import json
-            analysis = json.loads(result)
-            
-            # Validate percentages
-            ai_prob = max(0, min(100, analysis.get('ai_probability', 0)))
-            human_prob = max(0, min(100, analysis.get('human_probability', 0)))
-            
-            # Normalize percentages to sum to 100
-            total = ai_prob + human_prob
-            if total > 0:
-                ai_prob = (ai_prob / total) * 100
-                human_prob = (human_prob / total) * 100
-            else:
-                ai_prob = 50
-                human_prob = 50
-
-            return {
-                'ai_probability': round(ai_prob, 1),
-                'human_probability': round(human_prob, 1),
-                'confidence': analysis.get('confidence', 75),
-                'reasoning': analysis.get('reasoning', 'Analysis completed'),
-                'indicators': analysis.get('indicators', {
-                    'ai_indicators': [],
-                    'human_indicators': []
-                }),
-                'code_stats': self._get_code_stats(code)
-            }
+            analysis = self._parse_json(response.text)
+            return self._build_result(analysis, code)
 
         except json.JSONDecodeError:
             return {
@@ -112,34 +123,219 @@ class AICodePlagiarismChecker:
                 'human_probability': 0
             }
 
-    def _get_code_stats(self, code):
-        """Get basic statistics about the code"""
-        lines = code.split('\n')
+    def _cached_result(self, code):
+        """The cached result for code with this request's code stats, or None"""
+        if not self.cache or self._too_short(code):
+            return None
+        try:
+            result = self.cache.get(code)
+        except Exception as e:
+            print(f"Code analysis cache error: {e}")
+            return None
+        if result is None:
+            return None
+        return {**result, 'code_stats': self._get_code_stats(code), 'cached': True, 'tier': 'cache'}
+
+    def _local_result(self, code):
+        """The local stylometric model's verdict if it is confident enough, else None"""
+        if not self.local_detector or self._too_short(code):
+            return None
+        try:
+            probability = self.local_detector.score(code)
+        except Exception as e:
+            print(f"Local code detector error: {e}")
+            return None
+        if probability is None or max(probability, 1 - probability) < self.local_confidence:
+            return None
+
+        return {
+            'ai_probability': round(probability * 100, 1),
+            'human_probability': round((1 - probability) * 100, 1),
+            'confidence': round(max(probability, 1 - probability) * 100, 1),
+            'reasoning': 'Scored by the local stylometric model',
+            'indicators': self.local_detector.indicators(code),
+            'code_stats': self._get_code_stats(code),
+            'cached': False,
+            'tier': 'local'
+        }
+
+    def _store(self, code, result):
+        """Cache a fresh result (errors are never cached) and flag it as not cached"""
+        if self.cache and 'error' not in result:
+            try:
+                self.cache.put(code, result)
+            except Exception as e:
+                print(f"Code analysis cache error: {e}")
+        result['cached'] = False
+        result['tier'] = 'llm'
+        return result
+
+    def _too_short(self, code):
+        return not code or len(code.strip()) < MIN_CODE_LENGTH
+
+    def _too_short_result(self):
+        """Rejected before any tier runs, hence no tier"""
+        return {
+            'error': f'Code too short for analysis (minimum {MIN_CODE_LENGTH} characters)',
+            'ai_probability': 0,
+            'human_probability': 0,
+            'cached': False,
+            'tier': None
+        }
+
+    def _parse_json(self, text):
+        """Strip Markdown code fences from a model response and parse it as JSON"""
+        result = text.strip()
+        if '```json' in result:
+            result = result.split('```json')[1].split('```')[0].strip()
+        elif '```' in result:
+            result = result.split('```')[1].split('```')[0].strip()
+        return json.loads(result)
+
+    def _build_result(self, analysis, code):
+        """Turn one parsed analysis into the API result for code"""
+        # Validate percentages
+        ai_prob = max(0, min(100, analysis.get('ai_probability', 0)))
+        human_prob = max(0, min(100, analysis.get('human_probability', 0)))
         
+        # Normalize percentages to sum to 100
+        total = ai_prob + human_prob
+        if total > 0:
+            ai_prob = (ai_prob / total) * 100
+            human_prob = (human_prob / total) * 100
+        else:
+            ai_prob = 50
+            human_prob = 50
+
         return {
-            'total_lines': len(lines),
-            'non_empty_lines': len([line for line in lines if line.strip()]),
-            'comment_lines': len([line for line in lines if line.strip().startswith('#') or line.strip().startswith('//')]),
-            'total_characters': len(code),
-            'has_functions': bool(re.search(r'def\s+\w+|function\s+\w+|const\s+\w+\s*=', code)),
-            'has_classes': bool(re.search(r'class\s+\w+', code)),
-            'has_imports': bool(re.search(r'import\s+|from\s+\w+\s+import|#include|require\(', code))
+            'ai_probability': round(ai_prob, 1),
+            'human_probability': round(human_prob, 1),
+            'confidence': analysis.get('confidence', 75),
+            'reasoning': analysis.get('reasoning', 'Analysis completed'),
+            'indicators': analysis.get('indicators', {
+                'ai_indicators': [],
+                'human_indicators': []
+            }),
+            'code_stats': self._get_code_stats(code)
         }
 
+    def _generate(self, prompt):
+        """One Gemini call, spaced by the shared rate limiter and bounded by the request timeout"""
+        self.rate_limiter.wait('gemini')
+        return self.model.generate_content(prompt, request_options={'timeout': self.request_timeout})
+
+    def _get_code_stats(self, code):
+        """Get basic statistics about the code"""
+        return code_stats(code)
+
     def batch_analyze(self, code_snippets):
-        """Analyze multiple code snippets"""
-        results = []
-        
+        """Analyze multiple code snippets, up to max_concurrency requests at a time; results keep input order.
+
+        With a pack token budget, short snippets share one request (see _pack).
+        Cached snippets, and those the local model is sure about, are answered without a request.
+        """
+        results = [None] * len(code_snippets)
         for i, code in enumerate(code_snippets):
-            result = self.analyze_code(code)
+            if self._too_short(code):
+                results[i] = self._too_short_result()
+            else:
+                results[i] = self._cached_result(code) or self._local_result(code)
+        pending = [i for i, result in enumerate(results) if result is None]
+        groups = self._pack(code_snippets, pending) if self.pack_token_budget else [[i] for i in pending]
+
+        def run(group):
+            if len(group) == 1:
+                return {group[0]: self._analyze(code_snippets[group[0]])}
+            return self._analyze_packed(code_snippets, group)
+
+        if groups:
+            workers = min(self.max_concurrency, len(groups))
+            # Only the Gemini calls run on the pool; cache reads and writes stay on this thread
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='plagiarism') as pool:
+                for group_results in pool.map(run, groups):
+                    for i, result in group_results.items():
+                        results[i] = self._store(code_snippets[i], result)
+
+        for i, result in enumerate(results):
             result['snippet_id'] = i + 1
-            results.append(result)
         
         return {
             'individual_results': results,
             'summary': self._generate_summary(results)
         }
 
+    def _pack(self, code_snippets, indices):
+        """Group snippet indices, in order, into requests of at most pack_token_budget code tokens"""
+        groups = []
+        group = []
+        group_tokens = 0
+        for i in indices:
+            tokens = estimate_tokens(code_snippets[i])
+            if group and (group_tokens + tokens > self.pack_token_budget or len(group) >= PACK_MAX_SNIPPETS):
+                groups.append(group)
+                group, group_tokens = [], 0
+            group.append(i)
+            group_tokens += tokens
+        if group:
+            groups.append(group)
+        return groups
+
+    def _analyze_packed(self, code_snippets, group):
+        """Analyze several snippets with one request; returns {index: result}.
+
+        Snippets missing from the model's answer, or all of them if it cannot
+        be parsed, are analyzed again one request each.
+        """
+        snippet_sections = "\n".join(
+            f"Snippet {i + 1}:\n```\n{code_snippets[i]}\n```\n" for i in group
+        )
+        prompt = f"""
+            Analyze each of the following code snippets and determine if it was written by AI or a human programmer.
+            Judge every snippet on its own; they come from different authors.
+            
+            Consider these factors:
+            1. Code structure and patterns
+            2. Variable naming conventions
+            3. Comments style and frequency
+            4. Code complexity and organization
+            5. Common AI-generated code patterns
+            6. Human coding habits and inconsistencies
+            
+            {snippet_sections}
+            
+            Return a JSON array with one object per snippet, in this exact format:
+            [
+                {{
+                    "snippet_id": <the snippet number>,
+                    "ai_probability": <percentage 0-100>,
+                    "human_probability": <percentage 0-100>,
+                    "confidence": <percentage 0-100>,
+                    "reasoning": "Brief explanation of your analysis",
+                    "indicators": {{
+                        "ai_indicators": ["list", "of", "ai", "patterns"],
+                        "human_indicators": ["list", "of", "human", "patterns"]
+                    }}
+                }}
+            ]
+            """
+
+        results = {}
+        try:
+            analyses = self._parse_json(self._generate(prompt).text)
+            if not isinstance(analyses, list):
+                raise ValueError("expected a JSON array")
+            for analysis in analyses:
+                i = int(analysis.get('snippet_id', 0)) - 1
+                if i in group and i not in results:
+                    results[i] = self._build_result(analysis, code_snippets[i])
+        except Exception as e:
+            print(f"Packed analysis error, falling back to single requests: {e}")
+
+        for i in group:
+            if i not in results:
+                results[i] = self._analyze(code_snippets[i])
+        return results
+
     def _generate_summary(self, results):
         """Generate summary statistics for batch analysis"""
         if not results:
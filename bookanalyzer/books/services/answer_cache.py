@@ -0,0 +1,145 @@
+import re
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from books.models import Chat
+from books.services.vector_index import get_embedder
+
+# Answers that report a failure instead of answering; never served from cache
+UNCACHEABLE_PREFIXES = ('Error:', 'Book not indexed yet')
+# Embeddings barely tell "chapter 3" from "chapter 4"; a near-duplicate must name the same numbers
+NUMBER_WORDS = frozenset("""
+    zero one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen sixteen
+    seventeen eighteen nineteen twenty thirty forty fifty hundred thousand first second third fourth fifth
+    sixth seventh eighth ninth tenth eleventh twelfth last final
+""".split())
+
+
+def normalize_question(question):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    question = re.sub(r'[^\w\s]', ' ', question.lower())
+    return ' '.join(question.split())[:500]
+
+
+def number_tokens(normalized):
+    """Digits and number words of a normalized question"""
+    return frozenset(token for token in normalized.split() if token.isdigit() or token in NUMBER_WORDS)
+
+
+def is_cacheable_answer(answer):
+    return bool(answer) and not answer.startswith(UNCACHEABLE_PREFIXES)
+
+
+class AnswerCache:
+    """Serves answers from earlier Chat rows of the same book (or of books sharing its index).
+
+    Exact matches on the normalized question come first; if a similarity
+    threshold is configured and the embedding model is available, the
+    closest recent question above it is accepted too. Rows older than the
+    TTL or than the book's last (re)index are ignored.
+    """
+
+    def __init__(self, ttl=None, similarity=None, max_candidates=200):
+        if ttl is None:
+            ttl = getattr(settings, 'ANSWER_CACHE_TTL_SECONDS', 7 * 24 * 3600)
+        if similarity is None:
+            similarity = getattr(settings, 'ANSWER_CACHE_SIMILARITY', None)
+        self.ttl = timedelta(seconds=ttl)
+        self.similarity = similarity
+        self.max_candidates = max_candidates
+        self._embeddings = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def lookup(self, book, question):
+        """Return (chat, match) where match is 'exact' or 'semantic', or (None, None)"""
+        normalized = normalize_question(question)
+        candidates = self._candidates(book)
+
+        chat = candidates.filter(normalized_question=normalized).first()
+        if chat:
+            self._count('exact')
+            return chat, 'exact'
+
+        if self.similarity:
+            chat = self._semantic_match(candidates, normalized)
+            if chat:
+                self._count('semantic')
+                return chat, 'semantic'
+
+        self._count(None)
+        return None, None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            hits = self.exact_hits + self.semantic_hits
+            return {
+                'exact_hits': self.exact_hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _candidates(self, book):
+        cutoff = timezone.now() - self.ttl
+        if book.indexed_at and book.indexed_at > cutoff:
+            cutoff = book.indexed_at
+        # Books sharing a deduplicated index share their answers too
+        if book.document_id:
+            chats = Chat.objects.filter(document_id=book.document_id)
+        else:
+            chats = Chat.objects.filter(book=book, document__isnull=True)
+        return (
+            chats.filter(from_cache=False, created_at__gte=cutoff)
+            .exclude(normalized_question='')
+            .order_by('-created_at')
+        )
+
+    def _semantic_match(self, candidates, normalized):
+        embedder = get_embedder()
+        if not embedder:
+            return None
+
+        numbers = number_tokens(normalized)
+        chats = [chat for chat in candidates[:self.max_candidates] if number_tokens(chat.normalized_question) == numbers]
+        if not chats:
+            return None
+
+        query = self._embed(embedder, [normalized])[0]
+        matrix = self._embed(embedder, [chat.normalized_question for chat in chats])
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        return chats[best] if scores[best] >= self.similarity else None
+
+    def _embed(self, embedder, texts):
+        """Embed normalized questions, reusing vectors seen before"""
+        with self._lock:
+            known = {text: self._embeddings[text] for text in texts if text in self._embeddings}
+
+        missing = [text for text in dict.fromkeys(texts) if text not in known]
+        if missing:
+            vectors = embedder.encode(missing, convert_to_numpy=True, normalize_embeddings=True)
+            known.update(zip(missing, vectors))
+            with self._lock:
+                self._embeddings.update(zip(missing, vectors))
+                while len(self._embeddings) > 10000:
+                    self._embeddings.popitem(last=False)
+
+        return np.stack([known[text] for text in texts])
+
+    def _count(self, match):
+        with self._lock:
+            if match == 'exact':
+                self.exact_hits += 1
+            elif match == 'semantic':
+                self.semantic_hits += 1
+            else:
+                self.misses += 1
@@ -1,8 +1,9 @@
-import requests
 import os
 from bs4 import BeautifulSoup
 import google.generativeai as genai
 
+from books.services.http_session import DOWNLOAD_TIMEOUT, get_session
+
 class BookFinderService:
     def __init__(self):
         genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
@@ -34,7 +35,7 @@ class BookFinderService:
             url = f"http://libgen.rs/search.php?req={query}&lg_topic=libgen&open=0&view=simple&res=25&phrase=1&column=def"
             
             headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            response = requests.get(url, headers=headers, timeout=10)
+            response = get_session().get(url, headers=headers)
             
             if response.status_code == 200:
                 soup = BeautifulSoup(response.content, 'html.parser')
@@ -56,7 +57,7 @@ class BookFinderService:
             url = f"https://archive.org/search.php?query={query}&and[]=mediatype%3A%22texts%22"
             
             headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            response = requests.get(url, headers=headers, timeout=10)
+            response = get_session().get(url, headers=headers)
             
             if response.status_code == 200:
                 soup = BeautifulSoup(response.content, 'html.parser')
@@ -75,7 +76,7 @@ class BookFinderService:
             url = f"https://www.gutenberg.org/ebooks/search/?query={query}"
             
             headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            response = requests.get(url, headers=headers, timeout=10)
+            response = get_session().get(url, headers=headers)
             
             if response.status_code == 200:
                 # Parse Gutenberg results for PDF links
@@ -90,19 +91,18 @@ class BookFinderService:
         """Download PDF from URL"""
         try:
             headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            response = requests.get(pdf_url, headers=headers, stream=True, timeout=30)
-            
-            if response.status_code == 200:
-                filepath = f"media/temp/{filename}"
-                os.makedirs("media/temp", exist_ok=True)
-                
-                with open(filepath, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
+            with get_session().get(pdf_url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                if response.status_code == 200:
+                    filepath = f"media/temp/{filename}"
+                    os.makedirs("media/temp", exist_ok=True)
+                    
+                    with open(filepath, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=8192):
+                            f.write(chunk)
+                    
+                    return filepath
                 
-                return filepath
-            
-            return None
+                return None
         except Exception as e:
             print(f"Download error: {e}")
             return None
\ No newline at end of file
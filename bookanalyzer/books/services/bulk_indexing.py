@@ -0,0 +1,22 @@
+import os
+
+# Runs in worker processes, which may be spawned without Django set up:
+# nothing here (or in what it imports) may touch models or settings.
+
+
+def init_worker():
+    # Each worker indexes one whole PDF; nested page-extraction pools would oversubscribe the cores
+    os.environ['PDF_EXTRACT_WORKERS'] = '1'
+
+
+def index_pdf(index_key, pdf_path):
+    """Build one index in a worker process; returns (success, pages)"""
+    from books.services.registry import get_pdf_qa_service
+
+    pages = [0]
+
+    def progress(pages_done, pages_total):
+        pages[0] = pages_done
+
+    success = get_pdf_qa_service().build_index(index_key, pdf_path, progress=progress)
+    return success, pages[0]
@@ -0,0 +1,153 @@
+import mmap
+import os
+import pickle
+import struct
+from array import array
+
+import numpy as np
+
+# File layout (header integers little-endian uint64):
+#   magic | chunk count | offsets position | pages position
+#   | UTF-8 blob | offsets[count + 1] (uint64) | pages[count][2] (uint32)
+# Offsets are relative to the start of the blob, so chunk i is
+# blob[offsets[i]:offsets[i + 1]]; pages[i] is its first and last page,
+# 0 when unknown. Version 1 files have no pages position or pages table.
+MAGIC = b'BKCHUNK2'
+HEADER = struct.Struct('<8sQQQ')
+MAGIC_V1 = b'BKCHUNK1'
+HEADER_V1 = struct.Struct('<8sQQ')
+
+
+def write_chunk_store(path, chunks):
+    """Stream chunks into a store file, replacing it atomically.
+
+    Items are plain strings or Chunk tuples from books.services.chunking,
+    whose page numbers are stored alongside the text.
+    """
+    offsets = array('Q', [0])
+    pages = array('I')
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, 0, 0, 0))
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                pages.extend((0, 0))
+            else:
+                pages.extend((chunk.first_page or 0, chunk.last_page or 0))
+                chunk = chunk.text
+            data = chunk.encode('utf-8')
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+
+        offsets_position = f.tell()
+        np.asarray(offsets, dtype='<u8').tofile(f)
+        pages_position = f.tell()
+        np.asarray(pages, dtype='<u4').tofile(f)
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(offsets) - 1, offsets_position, pages_position))
+
+    # Readers holding the old file keep their mapping of the old inode
+    os.replace(tmp_path, path)
+    return len(offsets) - 1
+
+
+class ChunkStore:
+    """Read-only, memory-mapped view of a chunk store file.
+
+    Only the offsets table is touched on open; chunk text is decoded from
+    the mapping on access, so the OS pages in just what a request reads.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic = self._mmap[:8]
+        if magic == MAGIC:
+            _, count, offsets_position, pages_position = HEADER.unpack_from(self._mmap, 0)
+            self._blob_start = HEADER.size
+            pages = np.frombuffer(self._mmap, dtype='<u4', count=count * 2, offset=pages_position)
+            self._pages = pages.reshape(count, 2)
+        elif magic == MAGIC_V1:
+            _, count, offsets_position = HEADER_V1.unpack_from(self._mmap, 0)
+            self._blob_start = HEADER_V1.size
+            self._pages = None
+        else:
+            raise ValueError(f"Not a chunk store: {path}")
+
+        self._offsets = np.frombuffer(self._mmap, dtype='<u8', count=count + 1, offset=offsets_position)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        start = self._blob_start + int(self._offsets[index])
+        end = self._blob_start + int(self._offsets[index + 1])
+        return self._mmap[start:end].decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def page_range(self, index):
+        """(first_page, last_page) of a chunk, or None if the store does not know"""
+        if self._pages is None:
+            return None
+        first_page, last_page = (int(page) for page in self._pages[index])
+        return (first_page, last_page) if first_page else None
+
+    def close(self):
+        """Release the mapping (needed before replacing the file on Windows)"""
+        self._offsets = None
+        self._pages = None
+        self._mmap.close()
+
+    @property
+    def nbytes(self):
+        """Resident cost is the offsets and pages tables; chunk text belongs to the OS page cache"""
+        pages_nbytes = self._pages.nbytes if self._pages is not None else 0
+        return self._offsets.nbytes + pages_nbytes + HEADER.size
+
+
+class PickleChunkStore:
+    """The legacy chunk format: a pickled list of strings loaded into memory"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._chunks = pickle.load(f)
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def __getitem__(self, index):
+        return self._chunks[index]
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def page_range(self, index):
+        return None
+
+    @property
+    def nbytes(self):
+        return sum(len(chunk) for chunk in self._chunks) + 64 * len(self._chunks)
+
+
+def open_chunk_store(path):
+    """Open a chunk file, picking the reader from its extension"""
+    if path.endswith('.pkl'):
+        return PickleChunkStore(path)
+    return ChunkStore(path)
+
+
+def convert_pickle_store(pkl_path, store_path):
+    """Rewrite a legacy .pkl chunk file as a memory-mapped store"""
+    return write_chunk_store(store_path, PickleChunkStore(pkl_path))
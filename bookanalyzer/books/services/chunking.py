@@ -0,0 +1,114 @@
+import os
+import re
+from collections import namedtuple
+
+# Target chunk size and the overlap repeated at the start of the next chunk, in estimated tokens
+CHUNK_TOKENS = int(os.getenv('CHUNK_TOKENS', 400))
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', 60))
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+# first_page/last_page are 1-based; a chunk may run across a page break
+Chunk = namedtuple('Chunk', 'text first_page last_page')
+_Unit = namedtuple('_Unit', 'text page tokens starts_paragraph')
+
+
+def estimate_tokens(text):
+    """Rough subword token count (about four characters per token for English text)"""
+    return max(1, (len(text) + 3) // 4)
+
+
+def _split_long(sentence, max_tokens):
+    """Cut a sentence longer than max_tokens into word runs that fit"""
+    max_chars = max_tokens * 4
+    # A "word" that long (e.g. a table extracted without spaces) is cut by characters
+    words = [
+        word[i:i + max_chars] for word in sentence.split() for i in range(0, len(word), max_chars)
+    ]
+    piece = []
+    tokens = 0
+    for word in words:
+        word_tokens = estimate_tokens(word) + 1
+        if piece and tokens + word_tokens > max_tokens:
+            yield " ".join(piece)
+            piece, tokens = [], 0
+        piece.append(word)
+        tokens += word_tokens
+    if piece:
+        yield " ".join(piece)
+
+
+def _units(page_number, text, max_tokens):
+    """Sentences of a page, flagged where a paragraph (or the page) starts"""
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        starts_paragraph = True
+        for sentence in SENTENCE_END.split(paragraph):
+            sentence = " ".join(sentence.split())
+            if not sentence:
+                continue
+            for piece in _split_long(sentence, max_tokens) if estimate_tokens(sentence) > max_tokens else [sentence]:
+                yield _Unit(piece, page_number, estimate_tokens(piece), starts_paragraph)
+                starts_paragraph = False
+
+
+def _join(units):
+    parts = []
+    for i, unit in enumerate(units):
+        if i:
+            parts.append("\n\n" if unit.starts_paragraph else " ")
+        parts.append(unit.text)
+    return Chunk("".join(parts), units[0].page, units[-1].page)
+
+
+def iter_page_chunks(pages, max_tokens=None, overlap_tokens=None):
+    """Yield Chunks of about max_tokens from an iterable of (page_number, text).
+
+    Chunks end on sentence boundaries, preferably at a paragraph or page
+    break in their second half, and repeat up to overlap_tokens of trailing
+    sentences at the start of the next chunk so answers are not cut off at
+    chunk edges. Only one chunk's worth of text is held at a time.
+    """
+    max_tokens = max_tokens or CHUNK_TOKENS
+    if overlap_tokens is None:
+        overlap_tokens = CHUNK_OVERLAP_TOKENS
+    # Bounded so overlap plus the next sentence always fits in a chunk
+    overlap_tokens = min(overlap_tokens, max_tokens // 4)
+    unit_limit = max_tokens - overlap_tokens
+
+    buffer = []
+    buffer_tokens = 0
+    carried = 0  # Leading units of buffer that repeat the previous chunk
+
+    def cut():
+        # Latest paragraph start past the carried overlap that leaves the chunk at least half full
+        end = len(buffer)
+        tokens = 0
+        for i, unit in enumerate(buffer):
+            if i > carried and unit.starts_paragraph and tokens >= max_tokens // 2:
+                end = i
+            tokens += unit.tokens
+        emitted = buffer[:end]
+
+        tail = []
+        tail_tokens = 0
+        for unit in reversed(emitted[carried:]):
+            if tail_tokens + unit.tokens > overlap_tokens:
+                break
+            tail.insert(0, unit)
+            tail_tokens += unit.tokens
+        return _join(emitted), tail, buffer[end:]
+
+    for page_number, text in pages:
+        for unit in _units(page_number, text or "", unit_limit):
+            while buffer and buffer_tokens + unit.tokens > max_tokens:
+                chunk, tail, rest = cut()
+                yield chunk
+                buffer = tail + rest
+                buffer_tokens = sum(u.tokens for u in buffer)
+                carried = len(tail)
+            buffer.append(unit)
+            buffer_tokens += unit.tokens
+
+    if len(buffer) > carried:
+        yield _join(buffer)
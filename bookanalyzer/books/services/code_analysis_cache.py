@@ -0,0 +1,119 @@
+import hashlib
+import re
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from books.models import CodeAnalysis
+
+# Part of every key; bump it when the analysis prompt or model changes
+KEY_VERSION = 'gemini-1.5-flash:1'
+# Per-request fields that are not stored with a cached result
+TRANSIENT_FIELDS = ('code_stats', 'cached', 'tier', 'snippet_id')
+
+
+def guess_extension(code):
+    """'.py' for Python-looking code, else '.c' (C, C++ and Java share comment syntax)"""
+    if re.search(r'^\s*def\s+\w+\s*\(.*\)\s*:', code, re.MULTILINE):
+        return '.py'
+    if '{' in code or re.search(r';\s*$', code, re.MULTILINE):
+        return '.c'
+    return '.py'
+
+
+def remove_comments_and_empty_lines(code, ext):
+    """Same rules as remove_comments_and_empty_lines in ai_code_plagarism_checker.py"""
+    # Remove comments for Python, C/C++, Java
+    if ext == '.py':
+        code = re.sub(r'#.*', '', code)
+    else:
+        code = re.sub(r'//.*', '', code)  # Single-line comments
+        code = re.sub(r'/\*.*?\*/', '', code, flags=re.DOTALL)  # Multi-line comments
+    # Remove empty lines
+    code = '\n'.join([line for line in code.splitlines() if line.strip()])
+    return code
+
+
+def normalize_code(code):
+    """Drop comments and blank lines, and collapse whitespace after each line's indentation"""
+    code = remove_comments_and_empty_lines(code.replace('\r\n', '\n'), guess_extension(code))
+    lines = []
+    for line in code.splitlines():
+        indent = line[:len(line) - len(line.lstrip())]
+        lines.append(indent + ' '.join(line.split()))
+    return '\n'.join(lines)
+
+
+def code_hash(code):
+    return hashlib.sha256(f"{KEY_VERSION}\n{normalize_code(code)}".encode('utf-8')).hexdigest()
+
+
+class CodeAnalysisCache:
+    """Database-backed analyze_code results shared by all processes.
+
+    Entries expire after the TTL; beyond max_entries the least recently
+    used ones are deleted.
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        if ttl is None:
+            ttl = getattr(settings, 'CODE_ANALYSIS_CACHE_TTL_SECONDS', 30 * 24 * 3600)
+        if max_entries is None:
+            max_entries = getattr(settings, 'CODE_ANALYSIS_CACHE_MAX_ENTRIES', 10000)
+        self.ttl = timedelta(seconds=ttl)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, code):
+        """The stored result for code (without per-request fields), or None"""
+        key = code_hash(code)
+        entry = CodeAnalysis.objects.filter(code_hash=key, created_at__gte=timezone.now() - self.ttl).first()
+        with self._lock:
+            if entry:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not entry:
+            return None
+
+        CodeAnalysis.objects.filter(id=entry.id).update(hits=F('hits') + 1, last_used_at=timezone.now())
+        return entry.result
+
+    def put(self, code, result):
+        """Store a successful result for code and enforce the TTL and size bound"""
+        if 'error' in result:
+            return
+        stored = {key: value for key, value in result.items() if key not in TRANSIENT_FIELDS}
+        now = timezone.now()
+        defaults = {'result': stored, 'hits': 0, 'created_at': now, 'last_used_at': now}
+        try:
+            with transaction.atomic():
+                CodeAnalysis.objects.update_or_create(code_hash=code_hash(code), defaults=defaults)
+        except IntegrityError:
+            # Stored concurrently by another request for the same code
+            pass
+        self.prune()
+
+    def prune(self):
+        CodeAnalysis.objects.filter(created_at__lt=timezone.now() - self.ttl).delete()
+        excess = CodeAnalysis.objects.count() - self.max_entries
+        if excess > 0:
+            oldest = CodeAnalysis.objects.order_by('last_used_at').values_list('id', flat=True)[:excess]
+            CodeAnalysis.objects.filter(id__in=list(oldest)).delete()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'entries': CodeAnalysis.objects.count(),
+        }
@@ -0,0 +1,74 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class RateLimiter:
+    """Spaces out calls sharing a key (e.g. a host) by at least min_interval seconds"""
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, key, stop=None):
+        """Block until the key's next slot; returns False if stop was set meanwhile"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(key, 0.0))
+            self._next_slot[key] = slot + self.min_interval
+        delay = slot - now
+        if delay <= 0:
+            return not (stop and stop.is_set())
+        if stop:
+            return not stop.wait(delay)
+        time.sleep(delay)
+        return True
+
+
+def first_result(tasks, max_workers=None, timeout=None, with_status=False):
+    """Run tasks concurrently and return the first truthy result, or None.
+
+    Each task is called with a threading.Event that is set once a result has
+    been found (or the timeout hit), so long-running tasks can stop early.
+    Tasks that have not started yet are cancelled; the call returns without
+    waiting for the ones still running.
+
+    With with_status=True returns (result, complete); complete is False when
+    no result was found and a task raised or the timeout cut the run short,
+    i.e. None is not a reliable "nothing found".
+    """
+    if not tasks:
+        return (None, True) if with_status else None
+
+    result, complete = _first_result(tasks, max_workers, timeout)
+    return (result, complete) if with_status else result
+
+
+def _first_result(tasks, max_workers, timeout):
+    failed = False
+
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(tasks))
+    pending = {executor.submit(task, stop) for task in tasks}
+    deadline = time.monotonic() + timeout if timeout else None
+    try:
+        while pending:
+            remaining = deadline - time.monotonic() if deadline else None
+            if remaining is not None and remaining <= 0:
+                print("Concurrent tasks timed out")
+                return None, False
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Concurrent task failed: {e}")
+                    failed = True
+                    continue
+                if result:
+                    return result, True
+        return None, not failed
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,89 @@
+import hashlib
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from books.models import Book, IndexedDocument, IndexJob
+
+ACTIVE_JOB_STATES = (IndexJob.STATE_QUEUED, IndexJob.STATE_RUNNING)
+
+
+def stream_to_file(chunks, path):
+    """Write an iterable of byte chunks to path and return their SHA-256 hex digest"""
+    digest = hashlib.sha256()
+    with open(path, 'wb') as f:
+        for chunk in chunks:
+            if chunk:
+                digest.update(chunk)
+                f.write(chunk)
+    return digest.hexdigest()
+
+
+def hash_file(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_or_create_document(sha256):
+    try:
+        with transaction.atomic():
+            return IndexedDocument.objects.get_or_create(sha256=sha256)[0]
+    except IntegrityError:
+        # Created concurrently by another upload of the same bytes
+        return IndexedDocument.objects.get(sha256=sha256)
+
+
+def active_job_for(document, exclude_job=None):
+    """The queued or running job that is building this document's index, if any"""
+    jobs = IndexJob.objects.filter(book__document=document, state__in=ACTIVE_JOB_STATES)
+    if exclude_job is not None:
+        jobs = jobs.exclude(id=exclude_job.id)
+    return jobs.order_by('-created_at').first()
+
+
+def attach_document(book, sha256, job=None):
+    """Point book at the shared index for sha256; True if the caller has to build that index.
+
+    An already indexed document makes the book ready at once; one that is
+    being indexed by another job is simply shared (that job marks every
+    book of the document when it finishes). job is the caller's own job,
+    which never counts as that other job.
+    """
+    document = get_or_create_document(sha256)
+    previous_document_id = book.document_id
+
+    book.document = document
+    # The book is only as ready as its new document's index
+    book.is_indexed = document.is_indexed
+    book.indexed_at = document.indexed_at
+    book.save()
+
+    if previous_document_id and previous_document_id != document.id:
+        release_document(previous_document_id)
+
+    return not document.is_indexed and active_job_for(document, exclude_job=job) is None
+
+
+def mark_document_indexed(document):
+    """Record a finished index build on the document and all books sharing it"""
+    now = timezone.now()
+    IndexedDocument.objects.filter(id=document.id).update(is_indexed=True, indexed_at=now)
+    Book.objects.filter(document=document).update(is_indexed=True, indexed_at=now, updated_at=now)
+
+
+def release_document(document_id):
+    """Drop one reference; the document and its index files go once no book uses it"""
+    from books.services.pdf_qa_service import delete_index
+
+    with transaction.atomic():
+        document = IndexedDocument.objects.filter(id=document_id).first()
+        if document is None or document.books.exists():
+            return False
+        index_key = document.index_key
+        document.delete()
+
+    delete_index(index_key)
+    return True
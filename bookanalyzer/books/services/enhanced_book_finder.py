@@ -1,40 +1,134 @@
-import requests
 import os
+from datetime import timedelta
+from urllib.parse import urlparse
 from bs4 import BeautifulSoup
 import google.generativeai as genai
-import time
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from books.models import BookLookup
+
+from books.services.concurrency import RateLimiter, first_result
+from books.services.document_store import stream_to_file
+from books.services.http_session import DOWNLOAD_TIMEOUT, get_session
+
+# Requests to the same host are spaced by this many seconds
+HOST_MIN_INTERVAL = float(os.getenv('BOOK_FINDER_HOST_INTERVAL', 0.25))
+
+# Shared by all finders in the process so concurrent uploads respect it too
+host_rate_limiter = RateLimiter(HOST_MIN_INTERVAL)
+
+# How long search outcomes are reused; misses expire sooner so new uploads get found
+LOOKUP_TTL = timedelta(seconds=getattr(settings, 'BOOK_LOOKUP_TTL_SECONDS', 30 * 24 * 3600))
+NEGATIVE_LOOKUP_TTL = timedelta(seconds=getattr(settings, 'BOOK_LOOKUP_NEGATIVE_TTL_SECONDS', 24 * 3600))
 
 class EnhancedBookFinder:
-    def __init__(self):
+    GUTENBERG_URL = 'https://www.gutenberg.org'
+    ARCHIVE_URL = 'https://archive.org'
+    OPENLIBRARY_URL = 'https://openlibrary.org'
+    GOOGLE_BOOKS_URL = 'https://www.googleapis.com'
+
+    def __init__(self, base_urls=None, search_timeout=30):
         genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
         self.model = genai.GenerativeModel('gemini-1.5-flash')
+        # Override source hosts, e.g. {'ARCHIVE_URL': 'http://127.0.0.1:8001'} for stub servers
+        for name, url in (base_urls or {}).items():
+            setattr(self, name, url.rstrip('/'))
+        self.search_timeout = search_timeout
     
     def search_pdf_online(self, title, author):
-        """Enhanced PDF search with multiple sources"""
+        """Enhanced PDF search with multiple sources, queried concurrently"""
         
         # Clean title and author for better search
         clean_title = self._clean_search_term(title)
         clean_author = self._clean_search_term(author)
+        if not clean_title:
+            return None
+        
+        # Known outcome from an earlier search: no network needed
+        lookup = self._cached_lookup(clean_title, clean_author)
+        if lookup is not None:
+            print(f"Lookup cache hit: {lookup}")
+            return lookup.pdf_url or None
         
         search_methods = [
-            lambda: self._search_gutenberg(clean_title, clean_author),
-            lambda: self._search_archive_org(clean_title, clean_author),
-            lambda: self._search_openlibrary(clean_title, clean_author),
-            lambda: self._search_google_books(clean_title, clean_author)
+            lambda stop: self._search_gutenberg(clean_title, clean_author, stop),
+            lambda stop: self._search_archive_org(clean_title, clean_author, stop),
+            lambda stop: self._search_openlibrary(clean_title, clean_author, stop),
+            lambda stop: self._search_google_books(clean_title, clean_author, stop)
         ]
         
-        for search_method in search_methods:
-            try:
-                pdf_url = search_method()
-                if pdf_url:
-                    print(f"Found PDF: {pdf_url}")
-                    return pdf_url
-                time.sleep(1)  # Rate limiting
-            except Exception as e:
-                print(f"Search method failed: {e}")
-                continue
-        
-        return None
+        # First source to find a PDF wins; the others are cancelled
+        pdf_url, complete = first_result(search_methods, timeout=self.search_timeout, with_status=True)
+        if pdf_url:
+            print(f"Found PDF: {pdf_url}")
+        if pdf_url or complete:
+            self._store_lookup(clean_title, clean_author, pdf_url)
+        else:
+            # A source failed or the search timed out: a miss now says nothing for tomorrow
+            print(f"Search for '{clean_title}' incomplete; not caching the miss")
+        return pdf_url
+
+    def forget_lookup(self, title, author):
+        """Drop the cached outcome, e.g. when the cached PDF URL failed to download"""
+        title_key, author_key = self._lookup_key(self._clean_search_term(title), self._clean_search_term(author))
+        BookLookup.objects.filter(title_key=title_key, author_key=author_key).delete()
+
+    def _lookup_key(self, clean_title, clean_author):
+        return ' '.join(clean_title.lower().split())[:255], ' '.join(clean_author.lower().split())[:255]
+
+    def _cached_lookup(self, clean_title, clean_author):
+        title_key, author_key = self._lookup_key(clean_title, clean_author)
+        return BookLookup.objects.filter(
+            title_key=title_key, author_key=author_key, expires_at__gt=timezone.now()
+        ).first()
+
+    def _store_lookup(self, clean_title, clean_author, pdf_url):
+        title_key, author_key = self._lookup_key(clean_title, clean_author)
+        ttl = LOOKUP_TTL if pdf_url else NEGATIVE_LOOKUP_TTL
+        try:
+            with transaction.atomic():
+                BookLookup.objects.update_or_create(
+                    title_key=title_key,
+                    author_key=author_key,
+                    defaults={'pdf_url': pdf_url or '', 'expires_at': timezone.now() + ttl},
+                )
+        except IntegrityError:
+            # Stored concurrently by another search for the same book; either outcome will do
+            pass
+
+    def _get(self, url, stop=None, **kwargs):
+        """GET url after waiting for its host's rate-limit slot; None if the search was cancelled.
+
+        Raises for throttling and server errors: the source is down, which
+        is not the same as the book not being there.
+        """
+        if not host_rate_limiter.wait(urlparse(url).netloc, stop):
+            return None
+        response = get_session().get(url, **kwargs)
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()
+        return response
+
+    def _first_existing_pdf(self, pdf_urls, stop=None):
+        """HEAD all candidate PDF URLs at once and return the first that exists"""
+        def check(pdf_url):
+            def task(task_stop):
+                if stop and stop.is_set():
+                    return None
+                if not host_rate_limiter.wait(urlparse(pdf_url).netloc, task_stop):
+                    return None
+                pdf_check = get_session().head(pdf_url, allow_redirects=True)
+                if pdf_check.status_code == 429 or pdf_check.status_code >= 500:
+                    pdf_check.raise_for_status()
+                return pdf_url if pdf_check.status_code == 200 else None
+            return task
+
+        pdf_url, complete = first_result([check(url) for url in dict.fromkeys(pdf_urls)], max_workers=8, with_status=True)
+        if not pdf_url and not complete:
+            raise RuntimeError("Could not check all candidate PDFs")
+        return pdf_url
     
     def _clean_search_term(self, term):
         """Clean search terms for better matching"""
@@ -42,19 +136,19 @@ class EnhancedBookFinder:
             return ""
         return term.strip().replace("'", "").replace('"', '')
     
-    def _search_gutenberg(self, title, author):
+    def _search_gutenberg(self, title, author, stop=None):
         """Search Project Gutenberg for free books"""
         try:
             if not title:
                 return None
                 
             query = f"{title} {author}".strip().replace(" ", "+")
-            url = f"https://www.gutenberg.org/ebooks/search/?query={query}&submit_search=Go%21"
+            url = f"{self.GUTENBERG_URL}/ebooks/search/?query={query}&submit_search=Go%21"
             
             headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            response = requests.get(url, headers=headers, timeout=10)
+            response = self._get(url, stop, headers=headers)
             
-            if response.status_code == 200:
+            if response is not None and response.status_code == 200:
                 soup = BeautifulSoup(response.content, 'html.parser')
                 
                 # Look for PDF download links
@@ -62,87 +156,85 @@ class EnhancedBookFinder:
                     href = link['href']
                     if '.pdf' in href and 'files' in href:
                         if href.startswith('/'):
-                            return f"https://www.gutenberg.org{href}"
+                            return f"{self.GUTENBERG_URL}{href}"
                         return href
             
             return None
         except Exception as e:
             print(f"Gutenberg search error: {e}")
-            return None
+            raise
     
-    def _search_archive_org(self, title, author):
+    def _search_archive_org(self, title, author, stop=None):
         """Search Internet Archive"""
         try:
             if not title:
                 return None
                 
             query = f"{title} {author}".strip().replace(" ", "%20")
-            url = f"https://archive.org/search.php?query={query}&and[]=mediatype%3A%22texts%22"
+            url = f"{self.ARCHIVE_URL}/search.php?query={query}&and[]=mediatype%3A%22texts%22"
             
             headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            response = requests.get(url, headers=headers, timeout=10)
+            response = self._get(url, stop, headers=headers)
             
-            if response.status_code == 200:
+            if response is not None and response.status_code == 200:
                 soup = BeautifulSoup(response.content, 'html.parser')
                 
                 # Look for item links
+                pdf_urls = []
                 for link in soup.find_all('a', class_='stealth'):
                     if '/details/' in link['href']:
                         item_id = link['href'].split('/details/')[-1]
-                        pdf_url = f"https://archive.org/download/{item_id}/{item_id}.pdf"
-                        
-                        # Check if PDF exists
-                        pdf_check = requests.head(pdf_url, timeout=5)
-                        if pdf_check.status_code == 200:
-                            return pdf_url
+                        pdf_urls.append(f"{self.ARCHIVE_URL}/download/{item_id}/{item_id}.pdf")
+                
+                # Check which PDFs exist
+                return self._first_existing_pdf(pdf_urls, stop)
             
             return None
         except Exception as e:
             print(f"Archive.org search error: {e}")
-            return None
+            raise
     
-    def _search_openlibrary(self, title, author):
+    def _search_openlibrary(self, title, author, stop=None):
         """Search Open Library"""
         try:
             if not title:
                 return None
                 
             query = f"{title} {author}".strip()
-            url = f"https://openlibrary.org/search.json?title={query}&limit=5"
+            url = f"{self.OPENLIBRARY_URL}/search.json?title={query}&limit=5"
             
             headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            response = requests.get(url, headers=headers, timeout=10)
+            response = self._get(url, stop, headers=headers)
             
-            if response.status_code == 200:
+            if response is not None and response.status_code == 200:
                 data = response.json()
                 
+                pdf_urls = []
                 for book in data.get('docs', []):
                     if 'ia' in book:  # Internet Archive identifier
                         ia_id = book['ia'][0] if isinstance(book['ia'], list) else book['ia']
-                        pdf_url = f"https://archive.org/download/{ia_id}/{ia_id}.pdf"
-                        
-                        # Verify PDF exists
-                        pdf_check = requests.head(pdf_url, timeout=5)
-                        if pdf_check.status_code == 200:
-                            return pdf_url
+                        pdf_urls.append(f"{self.ARCHIVE_URL}/download/{ia_id}/{ia_id}.pdf")
+                
+                # Verify which PDFs exist
+                return self._first_existing_pdf(pdf_urls, stop)
             
             return None
         except Exception as e:
             print(f"OpenLibrary search error: {e}")
-            return None
+            raise
     
-    def _search_google_books(self, title, author):
+    def _search_google_books(self, title, author, stop=None):
         """Search Google Books API for free books"""
         try:
             if not title:
                 return None
                 
             query = f"{title} {author}".strip()
-            url = f"https://www.googleapis.com/books/v1/volumes?q={query}&filter=free-ebooks&maxResults=5"
+            url = f"{self.GOOGLE_BOOKS_URL}/books/v1/volumes?q={query}&filter=free-ebooks&maxResults=5"
             
-            response = requests.get(url, timeout=10)
+            response = self._get(url, stop)
             
-            if response.status_code == 200:
+            if response is not None and response.status_code == 200:
                 data = response.json()
                 
                 for item in data.get('items', []):
@@ -157,35 +249,33 @@ class EnhancedBookFinder:
             return None
         except Exception as e:
             print(f"Google Books search error: {e}")
-            return None
+            raise
     
-    def download_pdf(self, pdf_url, filename):
-        """Download PDF with better error handling"""
+    def download_pdf(self, pdf_url, filename, with_hash=False):
+        """Download PDF with better error handling.
+
+        Returns the file path, or (path, sha256) with with_hash=True; the
+        hash is computed while the bytes are streamed to disk.
+        """
+        filepath, sha256 = None, None
         try:
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
                 'Accept': 'application/pdf,*/*'
             }
             
-            response = requests.get(pdf_url, headers=headers, stream=True, timeout=60)
-            
-            if response.status_code == 200:
-                os.makedirs("media/temp", exist_ok=True)
-                filepath = f"media/temp/{filename}"
-                
-                with open(filepath, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                
-                # Verify it's a valid PDF
-                if os.path.getsize(filepath) > 1000:  # At least 1KB
-                    return filepath
-                else:
-                    os.unlink(filepath)
-                    return None
-            
-            return None
+            with get_session().get(pdf_url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                if response.status_code == 200:
+                    os.makedirs("media/temp", exist_ok=True)
+                    filepath = f"media/temp/{filename}"
+                    sha256 = stream_to_file(response.iter_content(chunk_size=8192), filepath)
+                    
+                    # Verify it's a valid PDF
+                    if os.path.getsize(filepath) <= 1000:  # At least 1KB
+                        os.unlink(filepath)
+                        filepath, sha256 = None, None
         except Exception as e:
             print(f"Download error: {e}")
-            return None
\ No newline at end of file
+            filepath, sha256 = None, None
+        
+        return (filepath, sha256) if with_hash else filepath
@@ -0,0 +1,115 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 10))
+DOWNLOAD_READ_TIMEOUT = float(os.getenv('HTTP_DOWNLOAD_READ_TIMEOUT', 60))
+# Keep-alive connections kept per host
+POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 10))
+MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 2))
+
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+DOWNLOAD_TIMEOUT = (CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT)
+
+
+class ConnectionCounters:
+    """Connection checkouts vs. newly opened connections across all pools"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.opened = 0
+
+    def record_checkout(self):
+        with self._lock:
+            self.checkouts += 1
+
+    def record_open(self):
+        with self._lock:
+            self.opened += 1
+
+    def stats(self):
+        with self._lock:
+            reused = max(self.checkouts - self.opened, 0)
+            return {
+                'requests': self.checkouts,
+                'connections_opened': self.opened,
+                'connections_reused': reused,
+                'reuse_rate': round(reused / self.checkouts, 4) if self.checkouts else 0.0,
+            }
+
+
+counters = ConnectionCounters()
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _get_conn(self, timeout=None):
+        counters.record_checkout()
+        return super()._get_conn(timeout)
+
+    def _new_conn(self):
+        counters.record_open()
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _get_conn(self, timeout=None):
+        counters.record_checkout()
+        return super()._get_conn(timeout)
+
+    def _new_conn(self):
+        counters.record_open()
+        return super()._new_conn()
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """Keep-alive pools per host, retry with backoff, and a default timeout"""
+
+    def __init__(self):
+        retry = Retry(
+            total=MAX_RETRIES,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({'GET', 'HEAD'}),
+            raise_on_status=False,
+        )
+        super().__init__(pool_connections=20, pool_maxsize=POOL_SIZE, max_retries=retry)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = DEFAULT_TIMEOUT
+        return super().send(request, **kwargs)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """The process-wide requests.Session shared by all book finders"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = PooledHTTPAdapter()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def http_stats():
+    return counters.stats()
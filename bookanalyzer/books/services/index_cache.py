@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+
+
+class IndexCache:
+    """Thread-safe LRU cache bounded by the total byte size of its entries.
+
+    Values must expose an ``nbytes`` attribute. Each entry also remembers a
+    ``version`` (e.g. the index file's mtime) so that an index rewritten by
+    another process is reloaded instead of served stale.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, version, loader):
+        """Return the cached value for key, calling loader() on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Load outside the lock so other books are not blocked meanwhile
+        value = loader()
+
+        with self._lock:
+            self._remove(key)
+            if value.nbytes <= self.max_bytes:
+                self._entries[key] = (version, value)
+                self.current_bytes += value.nbytes
+                while self.current_bytes > self.max_bytes:
+                    oldest = next(iter(self._entries))
+                    self._remove(oldest)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'current_bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1].nbytes
@@ -0,0 +1,274 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from books.models import Book, IndexedDocument, IndexJob
+from books.services.document_store import ACTIVE_JOB_STATES, attach_document, mark_document_indexed, stream_to_file
+from books.services.registry import get_book_finder, get_pdf_qa_service
+
+MAX_ATTEMPTS = getattr(settings, 'INDEXING_MAX_ATTEMPTS', 3)
+# A running job whose worker has not reported for this long is requeued
+STALE_AFTER = timedelta(seconds=getattr(settings, 'INDEXING_STALE_SECONDS', 300))
+# Minimum seconds between progress writes to the database
+PROGRESS_INTERVAL = 1.0
+
+
+def save_upload(uploaded_file):
+    """Persist an uploaded PDF under media/pdfs/ for a worker; returns (path, sha256)"""
+    os.makedirs('media/pdfs', exist_ok=True)
+    pdf_path = f"media/pdfs/upload_{uuid.uuid4().hex}.pdf"
+    sha256 = stream_to_file(uploaded_file.chunks(), pdf_path)
+    return pdf_path, sha256
+
+
+def enqueue_pdf(book, pdf_path):
+    """Queue indexing of a PDF that is already on disk"""
+    job = IndexJob.objects.create(book=book, kind=IndexJob.KIND_PDF, pdf_path=pdf_path)
+    ensure_worker_pool()
+    return job
+
+
+def enqueue_search(book):
+    """Queue an online search for the book's PDF, followed by indexing"""
+    job = IndexJob.objects.create(book=book, kind=IndexJob.KIND_SEARCH)
+    ensure_worker_pool()
+    return job
+
+
+def supersede_jobs(book, reason='Replaced by an uploaded PDF'):
+    """Take the book's queued or running jobs off it before its document changes.
+
+    A job building a document that other books still share is handed to
+    one of them, which keeps waiting on it; otherwise the job is failed
+    and a running one stops at its next check.
+    """
+    jobs = IndexJob.objects.filter(book=book, state__in=ACTIVE_JOB_STATES)
+    if book.document_id:
+        heir = Book.objects.filter(document_id=book.document_id).exclude(id=book.id).first()
+        if heir:
+            jobs.update(book=heir)
+            return 0
+    return jobs.update(state=IndexJob.STATE_FAILED, error=reason, heartbeat_at=timezone.now())
+
+
+def job_status(job):
+    if job is None:
+        return None
+    return {
+        'job_id': job.id,
+        'kind': job.kind,
+        'state': job.state,
+        'pages_done': job.pages_done,
+        'pages_total': job.pages_total,
+        'attempts': job.attempts,
+        'error': job.error,
+    }
+
+
+def recover_stale_jobs():
+    """Requeue running jobs whose worker died (e.g. after a restart); fail those out of attempts"""
+    cutoff = timezone.now() - STALE_AFTER
+    stale = IndexJob.objects.filter(state=IndexJob.STATE_RUNNING, heartbeat_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        state=IndexJob.STATE_FAILED, error='Worker stopped responding'
+    )
+    requeued = stale.update(state=IndexJob.STATE_QUEUED, worker_id='')
+    return requeued, failed
+
+
+class IndexingWorkerPool:
+    """Worker threads that claim queued IndexJob rows and run them.
+
+    The database is the queue: a job is claimed with a conditional UPDATE,
+    so any number of pools (web processes, ``manage.py run_index_worker``)
+    can share it without an external broker.
+    """
+
+    def __init__(self, workers=2, poll_interval=2.0):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker_loop, args=(f"{self.worker_prefix}:{i}",),
+                name=f"index-worker-{i}", daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def notify(self):
+        """Wake idle workers so a new job starts without waiting for the next poll"""
+        self._wakeup.set()
+
+    def run_forever(self):
+        self.start()
+        try:
+            while not self._stop.is_set():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def _worker_loop(self, worker_id):
+        while not self._stop.is_set():
+            try:
+                recover_stale_jobs()
+                job = self._claim_next(worker_id)
+                if job:
+                    self._run(job)
+                    continue
+            except Exception as e:
+                print(f"Index worker error: {e}")
+            finally:
+                close_old_connections()
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _claim_next(self, worker_id):
+        for job in IndexJob.objects.filter(state=IndexJob.STATE_QUEUED).order_by('created_at')[:5]:
+            claimed = IndexJob.objects.filter(id=job.id, state=IndexJob.STATE_QUEUED).update(
+                state=IndexJob.STATE_RUNNING,
+                worker_id=worker_id,
+                heartbeat_at=timezone.now(),
+                attempts=F('attempts') + 1,
+            )
+            if claimed:
+                return IndexJob.objects.select_related('book__document').get(id=job.id)
+        return None
+
+    def _run(self, job):
+        print(f"Index job {job.id} started ({job.kind}, attempt {job.attempts})")
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job.id, done), daemon=True)
+        heartbeat.start()
+        try:
+            self._execute(job)
+        finally:
+            done.set()
+            heartbeat.join()
+
+    def _heartbeat(self, job_id, done):
+        """Keep the claim fresh through long phases (e.g. embedding) that report no pages"""
+        while not done.wait(STALE_AFTER.total_seconds() / 5):
+            try:
+                IndexJob.objects.filter(id=job_id, state=IndexJob.STATE_RUNNING).update(heartbeat_at=timezone.now())
+            finally:
+                close_old_connections()
+
+    def _execute(self, job):
+        try:
+            if job.kind == IndexJob.KIND_SEARCH and not (job.pdf_path and os.path.exists(job.pdf_path)):
+                job.pdf_path, sha256 = self._download_pdf(job)
+                if not job.pdf_path:
+                    self._finish(job, IndexJob.STATE_FAILED, 'No free PDF found online')
+                    return
+                IndexJob.objects.filter(id=job.id).update(pdf_path=job.pdf_path)
+                if not self._still_running(job):
+                    self._discard(job)
+                    return
+
+                # Same bytes as an indexed (or in-progress) book: share its index
+                if not attach_document(job.book, sha256, job=job):
+                    self._finish(job, IndexJob.STATE_DONE)
+                    return
+
+            last_write = [0.0]
+
+            def progress(pages_done, pages_total):
+                now = time.monotonic()
+                if now - last_write[0] >= PROGRESS_INTERVAL or pages_done == pages_total:
+                    last_write[0] = now
+                    IndexJob.objects.filter(id=job.id).update(pages_done=pages_done, pages_total=pages_total)
+
+            success = get_pdf_qa_service().build_index(job.book.index_key, job.pdf_path, progress=progress)
+        except Exception as e:
+            print(f"Index job {job.id} error: {e}")
+            success = False
+
+        if not self._still_running(job):
+            # Superseded while building (e.g. the user uploaded a PDF): leave its state alone
+            self._discard(job)
+            return
+
+        if success:
+            if job.book.document_id:
+                mark_document_indexed(job.book.document)
+            else:
+                now = timezone.now()
+                Book.objects.filter(id=job.book_id).update(is_indexed=True, indexed_at=now, updated_at=now)
+            self._finish(job, IndexJob.STATE_DONE)
+        elif job.attempts < MAX_ATTEMPTS:
+            IndexJob.objects.filter(id=job.id).update(
+                state=IndexJob.STATE_QUEUED, worker_id='', error='Index building failed, retrying'
+            )
+        else:
+            self._finish(job, IndexJob.STATE_FAILED, 'Index building failed')
+
+    def _download_pdf(self, job):
+        finder = get_book_finder()
+
+        pdf_url = finder.search_pdf_online(job.book.title, job.book.author)
+        if not pdf_url:
+            return None, None
+        pdf_path, sha256 = finder.download_pdf(pdf_url, f"book_{job.book_id}.pdf", with_hash=True)
+        if not pdf_path:
+            # Do not keep serving a URL that no longer downloads
+            finder.forget_lookup(job.book.title, job.book.author)
+        return pdf_path, sha256
+
+    def _still_running(self, job):
+        return IndexJob.objects.filter(id=job.id, state=IndexJob.STATE_RUNNING).exists()
+
+    def _discard(self, job):
+        """Clean up after a superseded job without touching its state or the book"""
+        if job.pdf_path and os.path.exists(job.pdf_path):
+            os.unlink(job.pdf_path)
+        document_id = job.book.document_id
+        if document_id and not IndexedDocument.objects.filter(id=document_id).exists():
+            # The replacing upload released this document; drop what was built for it
+            from books.services.pdf_qa_service import delete_index
+            delete_index(job.book.index_key)
+        print(f"Index job {job.id} superseded")
+
+    def _finish(self, job, state, error=''):
+        IndexJob.objects.filter(id=job.id).update(state=state, error=error, heartbeat_at=timezone.now())
+        if job.pdf_path and os.path.exists(job.pdf_path):
+            os.unlink(job.pdf_path)
+        print(f"Index job {job.id} {state}")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def ensure_worker_pool():
+    """Start this process's worker threads on first use (INDEXING_WORKERS=0 disables them)"""
+    global _pool
+    workers = getattr(settings, 'INDEXING_WORKERS', 2)
+    if workers <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = IndexingWorkerPool(workers=workers)
+            _pool.start()
+    _pool.notify()
+    return _pool
@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+
+from PyPDF2 import PdfReader
+
+# Pages handed to a worker process per task
+PAGES_PER_TASK = 16
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def extract_workers():
+    return int(os.getenv('PDF_EXTRACT_WORKERS', 0)) or os.cpu_count() or 1
+
+
+def _get_pool():
+    """The process pool shared by every extraction in this process.
+
+    One bounded pool, so concurrent index jobs split the CPUs instead of
+    each starting cpu_count processes. Workers are started by a fork server
+    (or spawned): forking a threaded web process can copy a lock held by
+    another thread into the child and deadlock it.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _pool = ProcessPoolExecutor(max_workers=extract_workers(), mp_context=context)
+        return _pool
+
+
+def _discard_pool(pool):
+    """Drop a broken pool so the next extraction starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def count_pages(pdf_path):
+    return len(PdfReader(pdf_path).pages)
+
+
+def _extract_page_range(pdf_path, start, stop):
+    """Extract pages [start, stop) in a worker process; each worker opens its own reader"""
+    reader = PdfReader(pdf_path)
+    texts = []
+    for page_number in range(start, stop):
+        try:
+            texts.append(reader.pages[page_number].extract_text() or "")
+        except Exception as e:
+            print(f"Page {page_number + 1} extraction error: {e}")
+            texts.append("")
+    return texts
+
+
+def iter_pdf_pages(pdf_path, workers=None, pages_per_task=PAGES_PER_TASK):
+    """Yield (page_number, text) in page order, extracting page ranges in parallel.
+
+    At most 2 * workers ranges are in flight, so memory stays bounded no
+    matter how long the book is. workers=1 extracts on the calling thread.
+    """
+    total = count_pages(pdf_path)
+    workers = workers or extract_workers()
+    ranges = [(start, min(start + pages_per_task, total)) for start in range(0, total, pages_per_task)]
+
+    if workers <= 1 or len(ranges) <= 1:
+        for start, stop in ranges:
+            for offset, text in enumerate(_extract_page_range(pdf_path, start, stop)):
+                yield start + offset, text
+        return
+
+    pool = _get_pool()
+    range_iter = iter(ranges)
+    pending = deque()
+    try:
+        for start, stop in islice(range_iter, workers * 2):
+            pending.append((start, pool.submit(_extract_page_range, pdf_path, start, stop)))
+        while pending:
+            start, future = pending.popleft()
+            texts = future.result()
+            for next_start, next_stop in islice(range_iter, 1):
+                pending.append((next_start, pool.submit(_extract_page_range, pdf_path, next_start, next_stop)))
+            for offset, text in enumerate(texts):
+                yield start + offset, text
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        # Also runs if the consumer stops early: drop ranges nobody will read
+        for _, future in pending:
+            future.cancel()
@@ -1,77 +1,231 @@
+import glob
 import os
-import pickle
+import uuid
 import google.generativeai as genai
-from PyPDF2 import PdfReader
 from dotenv import load_dotenv
 
+from books.services.chunk_store import open_chunk_store, write_chunk_store
+from books.services.chunking import iter_page_chunks
+from books.services.index_cache import IndexCache
+from books.services.pdf_extraction import count_pages, iter_pdf_pages
+from books.services.retrieval import ChunkRetriever
+from books.services.vector_index import DenseIndex, get_embedder
+
 load_dotenv()
 
+# Loaded book indexes shared by every PDFQAService in this process
+index_cache = IndexCache(max_bytes=int(os.getenv('INDEX_CACHE_MAX_BYTES', 512 * 1024 * 1024)))
+
+
+def index_name(index_key):
+    """File prefix of an index: 'doc_<sha256>' for shared indexes, 'book_<id>' for per-book ones.
+
+    index_key is either a book id or a document's 'doc_<sha256>' key
+    (see Book.index_key).
+    """
+    index_key = str(index_key)
+    return index_key if index_key.startswith('doc_') else f"book_{index_key}"
+
+
+def delete_index(index_key):
+    """Remove all files of an index and drop it from the cache"""
+    name = index_name(index_key)
+    paths = []
+    for suffix in ('.chunks', '_chunks.pkl', '_tfidf.joblib', '.faiss'):
+        paths.append(f"media/indexes/{name}{suffix}")
+        # Plus whatever a build still in progress has staged
+        paths.extend(glob.glob(f"media/indexes/{glob.escape(name + suffix)}.building*"))
+    for path in paths:
+        if os.path.exists(path):
+            os.unlink(path)
+    index_cache.invalidate(name)
+
+
+class BookIndex:
+    """Everything needed to answer questions about one book"""
+
+    def __init__(self, chunks, retriever=None, dense_index=None):
+        self.chunks = chunks
+        self.retriever = retriever
+        self.dense_index = dense_index
+
+    @property
+    def nbytes(self):
+        """Approximate in-memory size, used by the index cache"""
+        total = self.chunks.nbytes
+        if self.retriever:
+            total += self.retriever.nbytes
+        if self.dense_index:
+            total += self.dense_index.nbytes
+        return total
+
+
 class PDFQAService:
-    def __init__(self):
+    def __init__(self, top_k=5):
         genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
         self.model = genai.GenerativeModel('gemini-1.5-flash')
+        # Number of retrieved chunks sent to Gemini, independent of book size
+        self.top_k = top_k
         
     def extract_text_from_pdf(self, pdf_path):
         """Extract text from PDF file"""
         try:
-            reader = PdfReader(pdf_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+            return "\n".join(text for _, text in iter_pdf_pages(pdf_path)) + "\n"
         except Exception as e:
             print(f"PDF extraction error: {e}")
             return ""
     
-    def create_chunks(self, text, chunk_size=500):
+    def create_chunks(self, text, max_tokens=None, overlap_tokens=None):
         """Split text into chunks for indexing"""
-        words = text.split()
-        chunks = []
-        for i in range(0, len(words), chunk_size):
-            chunk = " ".join(words[i:i + chunk_size])
-            chunks.append(chunk)
-        return chunks
+        return [chunk.text for chunk in self.iter_chunks([(1, text)], max_tokens, overlap_tokens)]
+
+    def iter_chunks(self, pages, max_tokens=None, overlap_tokens=None):
+        """Yield overlapping, token-sized Chunks (with page numbers) from (page_number, text) pairs"""
+        return iter_page_chunks(pages, max_tokens, overlap_tokens)
     
-    def build_index(self, book_id, pdf_path):
-        """Store PDF text chunks (simplified without FAISS)"""
+    def _chunks_path(self, index_key):
+        return f"media/indexes/{index_name(index_key)}.chunks"
+
+    def _legacy_chunks_path(self, index_key):
+        return f"media/indexes/{index_name(index_key)}_chunks.pkl"
+
+    def find_chunks_path(self, index_key):
+        """Path of the book's chunk file in either format, or None if not indexed"""
+        for path in (self._chunks_path(index_key), self._legacy_chunks_path(index_key)):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _retriever_path(self, index_key):
+        return f"media/indexes/{index_name(index_key)}_tfidf.joblib"
+
+    def _dense_index_path(self, index_key):
+        return f"media/indexes/{index_name(index_key)}.faiss"
+
+    def build_index(self, index_key, pdf_path, progress=None):
+        """Store PDF text chunks with their TF-IDF and FAISS retrieval indexes.
+
+        progress, if given, is called as progress(pages_done, pages_total).
+        Every file is written under a name unique to this build and moved
+        into place at the end, so two builds of the same document (e.g.
+        simultaneous uploads of the same bytes) never write the same file.
+        """
+        build_id = uuid.uuid4().hex
+        staged = []
+
+        def staging(path):
+            staged.append(f"{path}.building-{build_id}")
+            return staged[-1]
+
         try:
-            # Extract text and create chunks
-            text = self.extract_text_from_pdf(pdf_path)
-            chunks = self.create_chunks(text)
+            chunks_path = self._chunks_path(index_key)
+            staging_path = staging(chunks_path)
+            pages_total = count_pages(pdf_path)
+
+            def pages():
+                for page_number, text in iter_pdf_pages(pdf_path):
+                    if progress:
+                        progress(page_number + 1, pages_total)
+                    yield page_number + 1, text
+
+            # Pages stream from the extractor pool through the chunker to disk
+            write_chunk_store(staging_path, self.iter_chunks(pages()))
+            chunks = open_chunk_store(staging_path)
             
-            # Save chunks only
-            chunks_path = f"media/indexes/book_{book_id}_chunks.pkl"
-            with open(chunks_path, 'wb') as f:
-                pickle.dump(chunks, f)
+            retriever_path = self._retriever_path(index_key)
+            retriever = ChunkRetriever.fit(chunks)
+            if retriever:
+                retriever.save(staging(retriever_path))
+
+            dense_path = self._dense_index_path(index_key)
+            embedder = get_embedder()
+            if embedder and len(chunks):
+                DenseIndex.build(chunks, embedder).save(staging(dense_path))
+
+            for path in (retriever_path, dense_path):
+                staged_path = f"{path}.building-{build_id}"
+                if os.path.exists(staged_path):
+                    os.replace(staged_path, path)
+                elif os.path.exists(path):
+                    os.unlink(path)
+
+            # Published last: its mtime is the version readers cache against
+            chunks.close()
+            os.replace(staging_path, chunks_path)
+            legacy_path = self._legacy_chunks_path(index_key)
+            if os.path.exists(legacy_path):
+                os.unlink(legacy_path)
+
+            index_cache.invalidate(index_name(index_key))
                 
             return True
         except Exception as e:
             print(f"Index building error: {e}")
             return False
+        finally:
+            for path in staged:
+                if os.path.exists(path):
+                    os.unlink(path)
     
-    def ask_question(self, book_id, question):
+    def ask_question(self, index_key, question):
         """Answer question about the book using Gemini"""
         try:
-            # Load chunks
-            chunks_path = f"media/indexes/book_{book_id}_chunks.pkl"
+            prompt = self._build_prompt(index_key, question)
+            if prompt is None:
+                return f"Book not indexed yet. Expected file: {self._chunks_path(index_key)}. Please upload the PDF first."
             
-            print(f"Looking for chunks at: {chunks_path}")
-            print(f"File exists: {os.path.exists(chunks_path)}")
-            
-            if not os.path.exists(chunks_path):
-                return f"Book not indexed yet. Expected file: {chunks_path}. Please upload the PDF first."
-            
-            with open(chunks_path, 'rb') as f:
-                chunks = pickle.load(f)
-            
-            print(f"Loaded {len(chunks)} chunks")
-            
-            # Use first few chunks as context (simplified)
-            context = "\n".join(chunks[:5])
+            response = self.model.generate_content(prompt)
+            return response.text.strip()
             
-            # Generate answer using Gemini
-            prompt = f"""
+        except Exception as e:
+            print(f"QA error: {e}")
+            return f"Error: {str(e)}"
+
+    def stream_answer(self, index_key, question):
+        """Yield the answer in pieces as Gemini generates them.
+
+        Errors are raised rather than yielded: part of the answer may
+        already have been sent, and the caller has to know it is incomplete.
+        """
+        try:
+            prompt = self._build_prompt(index_key, question)
+            if prompt is None:
+                yield f"Book not indexed yet. Expected file: {self._chunks_path(index_key)}. Please upload the PDF first."
+                return
+
+            for chunk in self.model.generate_content(prompt, stream=True):
+                if chunk.text:
+                    yield chunk.text
+
+        except Exception as e:
+            print(f"QA stream error: {e}")
+            raise
+
+    def _build_prompt(self, index_key, question):
+        """Retrieve the most relevant chunks and wrap them in the QA prompt; None if not indexed"""
+        # Load chunks
+        chunks_path = self.find_chunks_path(index_key)
+        
+        print(f"Looking for chunks at: {chunks_path}")
+        
+        if not chunks_path:
+            return None
+        
+        book_index = self.load_book_index(index_key)
+        chunks = book_index.chunks
+        
+        print(f"Loaded {len(chunks)} chunks")
+        
+        indices = self._retrieve(book_index, question)
+        if not indices:
+            # Nothing matched: fall back to the opening chunks
+            indices = range(min(self.top_k, len(chunks)))
+
+        context = "\n\n".join(self._cited_chunk(chunks, i) for i in sorted(indices))
+        
+        return f"""
             Based on the following content from the book, answer the question.
+            Passages are labelled with their pages; cite the pages your answer relies on, e.g. (p. 12).
             
             Book Content: {context}
             
@@ -79,10 +233,61 @@ class PDFQAService:
             
             Answer:
             """
-            
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
-            
-        except Exception as e:
-            print(f"QA error: {e}")
-            return f"Error: {str(e)}"
\ No newline at end of file
+
+    def _cited_chunk(self, chunks, index):
+        page_range = chunks.page_range(index)
+        if not page_range:
+            return chunks[index]
+        first_page, last_page = page_range
+        label = f"p. {first_page}" if first_page == last_page else f"pp. {first_page}-{last_page}"
+        return f"[{label}] {chunks[index]}"
+
+    def load_book_index(self, index_key):
+        """Return the book's index from the process-wide cache, loading it from disk on a miss"""
+        chunks_path = self.find_chunks_path(index_key)
+        stat = os.stat(chunks_path)
+        # A rebuilt index (possibly by another worker process) changes the version
+        version = (chunks_path, stat.st_mtime_ns, stat.st_size)
+        return index_cache.get(index_name(index_key), version, lambda: self._read_book_index(index_key, chunks_path))
+
+    def clear_index_cache(self):
+        index_cache.clear()
+
+    def _read_book_index(self, index_key, chunks_path):
+        chunks = open_chunk_store(chunks_path)
+
+        retriever = self._load_retriever(index_key, chunks)
+
+        dense_path = self._dense_index_path(index_key)
+        dense_index = DenseIndex.load(dense_path) if os.path.exists(dense_path) else None
+
+        return BookIndex(chunks, retriever, dense_index)
+
+    def _retrieve(self, book_index, question):
+        """Rank chunks with TF-IDF and, when available, the FAISS index (reciprocal rank fusion)"""
+        rankings = []
+
+        if book_index.retriever:
+            rankings.append(book_index.retriever.search(question, self.top_k * 2))
+
+        embedder = get_embedder() if book_index.dense_index else None
+        if embedder:
+            rankings.append(book_index.dense_index.search(question, embedder, self.top_k * 2))
+
+        scores = {}
+        for ranking in rankings:
+            for rank, index in enumerate(ranking):
+                scores[index] = scores.get(index, 0.0) + 1.0 / (60 + rank)
+
+        return sorted(scores, key=scores.get, reverse=True)[:self.top_k]
+
+    def _load_retriever(self, index_key, chunks):
+        """Load the saved TF-IDF index, building it for books indexed before retrieval existed"""
+        retriever_path = self._retriever_path(index_key)
+        if os.path.exists(retriever_path):
+            return ChunkRetriever.load(retriever_path)
+
+        retriever = ChunkRetriever.fit(chunks)
+        if retriever:
+            retriever.save(retriever_path)
+        return retriever
@@ -0,0 +1,133 @@
+import threading
+
+
+class ServiceRegistry:
+    """Process-wide, thread-safe holder of shared service instances.
+
+    Each service is built once, on first use or by warm_up() at startup.
+    Construction happens under a per-service lock, so concurrent requests
+    never build a second copy; a failed construction is retried on the
+    next call instead of caching the error.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory):
+        with self._lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is None:
+                instance = self._factories[name]()
+                self._instances[name] = instance
+        return instance
+
+    def warm_up(self, names=None):
+        """Build services ahead of the first request; returns the names that failed"""
+        failed = []
+        for name in names or list(self._factories):
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"Service warm-up error ({name}): {e}")
+                failed.append(name)
+        return failed
+
+    def reset(self, name=None):
+        """Drop built instances (all of them by default) so the next get() rebuilds them"""
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+    def built(self):
+        return sorted(self._instances)
+
+
+# Factories import lazily so importing the registry never pulls in Gemini or Django models
+
+def _ocr_service():
+    from books.services.ocr_service import OCRService
+    return OCRService()
+
+
+def _pdf_qa_service():
+    from books.services.pdf_qa_service import PDFQAService
+    return PDFQAService()
+
+
+def _book_finder():
+    from books.services.enhanced_book_finder import EnhancedBookFinder
+    return EnhancedBookFinder()
+
+
+def _answer_cache():
+    from books.services.answer_cache import AnswerCache
+    return AnswerCache()
+
+
+def _code_analysis_cache():
+    from books.services.code_analysis_cache import CodeAnalysisCache
+    return CodeAnalysisCache()
+
+
+def _code_detector():
+    from books.services.code_stylometry import LocalCodeDetector
+    return LocalCodeDetector.load()
+
+
+def _plagiarism_checker():
+    from books.services.ai_code_plagiarism_checker import AICodePlagiarismChecker
+    return AICodePlagiarismChecker(
+        cache=registry.get('code_analysis_cache'), local_detector=registry.get('code_detector'),
+    )
+
+
+registry = ServiceRegistry()
+registry.register('ocr', _ocr_service)
+registry.register('pdf_qa', _pdf_qa_service)
+registry.register('book_finder', _book_finder)
+registry.register('answer_cache', _answer_cache)
+registry.register('code_analysis_cache', _code_analysis_cache)
+registry.register('code_detector', _code_detector)
+registry.register('plagiarism_checker', _plagiarism_checker)
+
+
+def get_ocr_service():
+    return registry.get('ocr')
+
+
+def get_pdf_qa_service():
+    return registry.get('pdf_qa')
+
+
+def get_book_finder():
+    return registry.get('book_finder')
+
+
+def get_answer_cache():
+    return registry.get('answer_cache')
+
+
+def get_code_analysis_cache():
+    return registry.get('code_analysis_cache')
+
+
+def get_code_detector():
+    return registry.get('code_detector')
+
+
+def get_plagiarism_checker():
+    return registry.get('plagiarism_checker')
@@ -0,0 +1,62 @@
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+class ChunkRetriever:
+    """Top-k TF-IDF ranking of a book's chunks against a question"""
+
+    def __init__(self, vectorizer, matrix):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+
+    @classmethod
+    def fit(cls, chunks):
+        """Build the TF-IDF index over all chunks of a book"""
+        vectorizer = TfidfVectorizer(
+            stop_words='english',
+            sublinear_tf=True,
+            dtype=np.float32,
+        )
+        try:
+            matrix = vectorizer.fit_transform(chunks)
+        except ValueError:
+            # Empty vocabulary (no chunks, or only stop words)
+            return None
+        return cls(vectorizer, matrix.tocsr())
+
+    def search(self, question, top_k=5):
+        """Return indices of the top_k chunks, best match first"""
+        query = self.vectorizer.transform([question])
+        scores = (self.matrix @ query.T).toarray().ravel()
+
+        candidates = np.flatnonzero(scores)
+        if candidates.size == 0:
+            return []
+
+        if candidates.size > top_k:
+            best = np.argpartition(scores[candidates], -top_k)[-top_k:]
+            candidates = candidates[best]
+
+        ranked = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return ranked.tolist()
+
+    @property
+    def nbytes(self):
+        """Approximate in-memory size, used by the index cache"""
+        vocabulary_bytes = len(self.vectorizer.vocabulary_) * 100
+        return (
+            self.matrix.data.nbytes
+            + self.matrix.indices.nbytes
+            + self.matrix.indptr.nbytes
+            + self.vectorizer.idf_.nbytes
+            + vocabulary_bytes
+        )
+
+    def save(self, path):
+        joblib.dump({'vectorizer': self.vectorizer, 'matrix': self.matrix}, path)
+
+    @classmethod
+    def load(cls, path):
+        data = joblib.load(path)
+        return cls(data['vectorizer'], data['matrix'])
@@ -0,0 +1,87 @@
+import os
+import threading
+from itertools import islice
+
+import faiss
+import numpy as np
+
+# Name of a model in the local Hugging Face cache, or a path to a model directory
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+
+# Above this many chunks an HNSW graph replaces exhaustive search
+HNSW_THRESHOLD = 20000
+
+_embedder = None
+_embedder_failed = False
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """Load the sentence-transformers model from local files only, or None if unavailable"""
+    global _embedder, _embedder_failed
+    if _embedder is None and not _embedder_failed:
+        with _embedder_lock:
+            if _embedder is None and not _embedder_failed:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                    _embedder = SentenceTransformer(EMBEDDING_MODEL, local_files_only=True)
+                except Exception as e:
+                    print(f"Embedding model unavailable, using TF-IDF only: {e}")
+                    _embedder_failed = True
+    return _embedder
+
+
+class DenseIndex:
+    """FAISS inner-product index over L2-normalized chunk embeddings"""
+
+    def __init__(self, index):
+        self.index = index
+
+    @classmethod
+    def build(cls, chunks, embedder, batch_size=256):
+        """Embed chunks (a sized iterable) batch by batch and add them to a new index"""
+        dim = embedder.get_sentence_embedding_dimension()
+        if len(chunks) > HNSW_THRESHOLD:
+            index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = 64
+        else:
+            index = faiss.IndexFlatIP(dim)
+
+        chunk_iter = iter(chunks)
+        while True:
+            batch = list(islice(chunk_iter, batch_size))
+            if not batch:
+                break
+            vectors = embedder.encode(
+                batch,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            )
+            index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+
+        return cls(index)
+
+    def search(self, question, embedder, top_k=5):
+        """Return indices of the top_k nearest chunks, best match first"""
+        if self.index.ntotal == 0:
+            return []
+        query = embedder.encode([question], convert_to_numpy=True, normalize_embeddings=True)
+        _, ids = self.index.search(np.ascontiguousarray(query, dtype=np.float32), top_k)
+        return [int(i) for i in ids[0] if i >= 0]
+
+    @property
+    def nbytes(self):
+        """Approximate in-memory size, used by the index cache"""
+        vector_bytes = self.index.ntotal * self.index.d * 4
+        if isinstance(self.index, faiss.IndexHNSWFlat):
+            # Neighbour links: 2*M on level 0, stored as int32
+            vector_bytes += self.index.ntotal * self.index.hnsw.nb_neighbors(0) * 4
+        return vector_bytes
+
+    def save(self, path):
+        faiss.write_index(self.index, path)
+
+    @classmethod
+    def load(cls, path):
+        return cls(faiss.read_index(path))
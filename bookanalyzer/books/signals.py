@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from books.models import Book
+
+
+@receiver(post_delete, sender=Book)
+def release_book_index(sender, instance, **kwargs):
+    """Delete a book's index files once no other book shares them"""
+    from books.services.document_store import release_document
+    from books.services.pdf_qa_service import delete_index
+
+    if instance.document_id:
+        release_document(instance.document_id)
+    else:
+        delete_index(instance.id)
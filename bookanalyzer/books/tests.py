@@ -1,3 +1,286 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from requests import HTTPError
+from rest_framework.test import APIClient
+
+from books.models import Book, BookLookup, Chat, IndexJob
+from books.services.answer_cache import AnswerCache
+from books.services.indexing_jobs import IndexingWorkerPool, enqueue_search
+
+PDF_BYTES = b'%PDF-1.4 test document'
+
+
+class FakeFinder:
+    """Finds and "downloads" PDF_BYTES; on_download runs mid-download"""
+
+    def __init__(self, on_download=None):
+        self.on_download = on_download
+
+    def search_pdf_online(self, title, author):
+        return 'https://example.org/book.pdf'
+
+    def download_pdf(self, pdf_url, filename, with_hash=False):
+        if self.on_download:
+            self.on_download()
+        os.makedirs('media/pdfs', exist_ok=True)
+        path = f"media/pdfs/{filename}"
+        with open(path, 'wb') as f:
+            f.write(PDF_BYTES)
+        return path, hashlib.sha256(PDF_BYTES).hexdigest()
+
+    def forget_lookup(self, title, author):
+        pass
+
+
+@override_settings(INDEXING_WORKERS=0)
+class IndexingFlowTests(TestCase):
+    def setUp(self):
+        # Uploads and downloads are written under media/ relative to the working directory
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp()
+        os.chdir(self.tmp)
+        self.client = APIClient()
+        self.qa = mock.Mock()
+        self.qa.build_index.return_value = True
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def run_next_job(self, finder):
+        pool = IndexingWorkerPool(workers=0)
+        job = pool._claim_next('test:0')
+        with mock.patch('books.services.indexing_jobs.get_book_finder', return_value=finder), \
+                mock.patch('books.services.indexing_jobs.get_pdf_qa_service', return_value=self.qa):
+            pool._execute(job)
+        job.refresh_from_db()
+        return job
+
+    def upload(self, book, data=PDF_BYTES):
+        pdf = SimpleUploadedFile('book.pdf', data, content_type='application/pdf')
+        return self.client.post(reverse('upload_pdf'), {'pdf_file': pdf, 'book_id': book.id}, format='multipart')
+
+    def test_search_job_indexes_the_pdf_it_downloaded(self):
+        book = Book.objects.create(title='Dune', author='Frank Herbert')
+        enqueue_search(book)
+
+        job = self.run_next_job(FakeFinder())
+
+        book.refresh_from_db()
+        self.assertEqual(job.state, IndexJob.STATE_DONE)
+        self.qa.build_index.assert_called_once()
+        self.assertEqual(self.qa.build_index.call_args[0][0], book.index_key)
+        self.assertTrue(book.is_indexed)
+        self.assertTrue(book.document.is_indexed)
+
+    def test_upload_replaces_a_queued_search(self):
+        book = Book.objects.create(title='Dune', author='Frank Herbert')
+        search = enqueue_search(book)
+
+        response = self.upload(book)
+
+        search.refresh_from_db()
+        job = IndexJob.objects.get(id=response.data['job_id'])
+        self.assertEqual(search.state, IndexJob.STATE_FAILED)
+        self.assertEqual(job.kind, IndexJob.KIND_PDF)
+        self.assertEqual(job.state, IndexJob.STATE_QUEUED)
+        self.assertTrue(os.path.exists(job.pdf_path))
+
+        job = self.run_next_job(FakeFinder())
+        book.refresh_from_db()
+        self.assertEqual(job.state, IndexJob.STATE_DONE)
+        self.assertTrue(book.is_indexed)
+        status = self.client.get(reverse('book_status', args=[book.id])).data
+        self.assertEqual(status['job']['job_id'], job.id)
+
+    def test_upload_during_a_running_search_wins(self):
+        book = Book.objects.create(title='Dune', author='Frank Herbert')
+        enqueue_search(book)
+        uploaded = b'%PDF-1.4 the copy the user uploaded'
+
+        job = self.run_next_job(FakeFinder(on_download=lambda: self.upload(book, uploaded)))
+
+        book.refresh_from_db()
+        self.assertEqual(job.state, IndexJob.STATE_FAILED)
+        self.qa.build_index.assert_not_called()
+        self.assertFalse(os.path.exists(job.pdf_path))
+        self.assertEqual(book.document.sha256, hashlib.sha256(uploaded).hexdigest())
+        self.assertTrue(IndexJob.objects.filter(book=book, kind=IndexJob.KIND_PDF, state=IndexJob.STATE_QUEUED).exists())
+
+    def test_second_upload_of_same_bytes_shares_the_pending_job(self):
+        first = Book.objects.create(title='Dune', author='Frank Herbert')
+        second = Book.objects.create(title='Dune (copy)', author='Frank Herbert')
+
+        first_job_id = self.upload(first).data['job_id']
+        response = self.upload(second)
+
+        second.refresh_from_db()
+        self.assertEqual(response.data['job_id'], first_job_id)
+        self.assertEqual(IndexJob.objects.filter(kind=IndexJob.KIND_PDF).count(), 1)
+        self.assertEqual(second.document_id, Book.objects.get(id=first.id).document_id)
+        status = self.client.get(reverse('book_status', args=[second.id])).data
+        self.assertEqual(status['job']['job_id'], first_job_id)
+
+    def test_replacing_a_shared_upload_leaves_the_job_to_the_other_book(self):
+        first = Book.objects.create(title='Dune', author='Frank Herbert')
+        second = Book.objects.create(title='Dune (copy)', author='Frank Herbert')
+        shared_job_id = self.upload(first).data['job_id']
+        self.upload(second)
+
+        self.upload(first, b'%PDF-1.4 a different edition')
+
+        shared = IndexJob.objects.get(id=shared_job_id)
+        self.assertEqual(shared.state, IndexJob.STATE_QUEUED)
+        self.assertEqual(shared.book_id, second.id)
+        status = self.client.get(reverse('book_status', args=[second.id])).data
+        self.assertEqual(status['job']['job_id'], shared_job_id)
+
+        self.assertEqual(self.run_next_job(FakeFinder()).id, shared_job_id)
+        self.run_next_job(FakeFinder())
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertTrue(second.is_indexed)
+        self.assertTrue(first.is_indexed)
+        self.assertNotEqual(first.document_id, second.document_id)
+
+    def test_new_pdf_for_an_indexed_book_resets_it(self):
+        book = Book.objects.create(title='Dune', author='Frank Herbert')
+        self.upload(book)
+        self.run_next_job(FakeFinder())
+
+        self.upload(book, b'%PDF-1.4 a different edition')
+
+        book.refresh_from_db()
+        self.assertFalse(book.is_indexed)
+        self.assertIsNone(book.indexed_at)
+
+    def test_answers_about_the_previous_pdf_are_not_reused(self):
+        other = Book.objects.create(title='Dune (other edition)', author='Frank Herbert')
+        book = Book.objects.create(title='Dune', author='Frank Herbert')
+        edition = b'%PDF-1.4 a different edition'
+        self.upload(other, edition)
+        self.run_next_job(FakeFinder())
+        self.upload(book)
+        self.run_next_job(FakeFinder())
+        book.refresh_from_db()
+        Chat.objects.create(book=book, document=book.document, question='Who is Paul?',
+                            normalized_question='who is paul', answer='Paul Atreides')
+
+        self.upload(book, edition)
+
+        book.refresh_from_db()
+        self.assertTrue(book.is_indexed)
+        self.assertEqual(AnswerCache(similarity=0).lookup(book, 'Who is Paul?'), (None, None))
+
+
+class BookLookupCacheTests(TestCase):
+    def setUp(self):
+        from books.services.enhanced_book_finder import EnhancedBookFinder
+        self.finder = EnhancedBookFinder(search_timeout=0.5)
+
+    def search(self, *sources):
+        names = ['_search_gutenberg', '_search_archive_org', '_search_openlibrary', '_search_google_books']
+        with mock.patch.multiple(self.finder, **dict(zip(names, sources))):
+            return self.finder.search_pdf_online('Dune', 'Frank Herbert')
+
+    def not_found(self, *args):
+        return None
+
+    def test_miss_from_every_source_is_cached(self):
+        self.assertIsNone(self.search(*[self.not_found] * 4))
+        self.assertEqual(BookLookup.objects.get().pdf_url, '')
+
+    def test_failed_source_does_not_cache_a_miss(self):
+        def outage(*args):
+            raise ConnectionError('network unreachable')
+
+        self.assertIsNone(self.search(outage, *[self.not_found] * 3))
+        self.assertFalse(BookLookup.objects.exists())
+
+    def test_timeout_does_not_cache_a_miss(self):
+        def slow(*args):
+            time.sleep(1)
+
+        self.assertIsNone(self.search(slow, *[self.not_found] * 3))
+        self.assertFalse(BookLookup.objects.exists())
+
+    def test_lookup_stored_concurrently_is_not_an_error(self):
+        from django.db import IntegrityError
+        with mock.patch.object(BookLookup.objects, 'update_or_create', side_effect=IntegrityError('unique_book_lookup')):
+            self.assertEqual(self.search(lambda *args: 'https://example.org/dune.pdf', *[self.not_found] * 3),
+                             'https://example.org/dune.pdf')
+
+    def test_server_error_counts_as_a_failed_source(self):
+        response = mock.Mock(status_code=503)
+        response.raise_for_status.side_effect = HTTPError('503 Service Unavailable')
+        with mock.patch('books.services.enhanced_book_finder.get_session') as session:
+            session.return_value.get.return_value = response
+            with self.assertRaises(HTTPError):
+                self.finder._search_google_books('Dune', 'Frank Herbert')
+
+
+class CodeAnalysisTierTests(TestCase):
+    def test_too_short_code_is_rejected_without_a_tier(self):
+        from books.services.ai_code_plagiarism_checker import AICodePlagiarismChecker
+        model = mock.Mock()
+        checker = AICodePlagiarismChecker(model=model, cache=None, local_detector=None)
+
+        single = checker.analyze_code('x = 1')
+        batch = checker.batch_analyze(['x = 1'])['individual_results'][0]
+
+        model.generate_content.assert_not_called()
+        for result in (single, batch):
+            self.assertIn('error', result)
+            self.assertFalse(result['cached'])
+            self.assertIsNone(result['tier'])
+
+
+class AnswerStreamTests(TestCase):
+    async def ask(self, book, question):
+        response = await self.async_client.post(reverse('ask_question_stream'), {'book_id': book.id, 'question': question},
+                                                content_type='application/json')
+        return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+    async def test_answer_cut_off_by_an_error_is_not_cached(self):
+        from books.services.pdf_qa_service import PDFQAService
+        book = await Book.objects.acreate(title='Dune', author='Frank Herbert', is_indexed=True)
+        qa = PDFQAService()
+
+        def generate_content(prompt, stream=False):
+            yield mock.Mock(text='Chapter 3 covers ')
+            raise RuntimeError('504 Deadline Exceeded')
+
+        qa.model = mock.Mock(generate_content=generate_content)
+        with mock.patch.object(qa, '_build_prompt', return_value='prompt'), \
+                mock.patch('books.views.get_pdf_qa_service', return_value=qa):
+            body = await self.ask(book, 'What does chapter 3 cover?')
+
+        self.assertIn('event: error', body)
+        self.assertNotIn('event: done', body)
+        chat = await Chat.objects.aget()
+        self.assertEqual(chat.normalized_question, '')
+        self.assertIn('504 Deadline Exceeded', chat.answer)
+
+
+class AnswerCacheTests(TestCase):
+    def test_near_duplicates_must_name_the_same_numbers(self):
+        import numpy as np
+        book = Book.objects.create(title='Dune', author='Frank Herbert')
+        Chat.objects.create(book=book, question='Summarize chapter 4', normalized_question='summarize chapter 4',
+                            answer='Chapter 4 summary')
+        # Every question embeds to the same vector: only the number guard tells them apart
+        embedder = mock.Mock()
+        embedder.encode.side_effect = lambda texts, **kwargs: np.ones((len(texts), 2)) / np.sqrt(2)
+        cache = AnswerCache(similarity=0.92)
+
+        with mock.patch('books.services.answer_cache.get_embedder', return_value=embedder):
+            self.assertEqual(cache.lookup(book, 'Summarize chapter 3'), (None, None))
+            self.assertEqual(cache.lookup(book, 'Give me a summary of chapter 4')[1], 'semantic')
@@ -1,30 +1,18 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
+from asgiref.sync import sync_to_async
 from django.core.files.storage import default_storage
-from books.models import Book, Chat
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from books.models import Book, Chat, IndexJob
 # Import services lazily to avoid initialization errors
+from books.services.registry import (
+    get_answer_cache, get_code_analysis_cache, get_ocr_service, get_pdf_qa_service, get_plagiarism_checker,
+)
 import json
 import os
 
-# Initialize services lazily to avoid import errors
-ocr_service = None
-pdf_qa_service = None
-
-def get_ocr_service():
-    global ocr_service
-    if ocr_service is None:
-        from books.services.ocr_service import OCRService
-        ocr_service = OCRService()
-    return ocr_service
-
-def get_pdf_qa_service():
-    global pdf_qa_service
-    if pdf_qa_service is None:
-        from books.services.pdf_qa_service import PDFQAService
-        pdf_qa_service = PDFQAService()
-    return pdf_qa_service
-
 @api_view(['POST'])
 def upload_cover(request):
     """Upload book cover and extract details using OCR"""
@@ -87,43 +75,17 @@ def upload_cover(request):
         
         print(f"Book created: {book.title} by {book.author}")
         
-        # Try auto-search for PDF (simplified)
-        try:
-            from books.services.enhanced_book_finder import EnhancedBookFinder
-            finder = EnhancedBookFinder()
-            
-            pdf_url = finder.search_pdf_online(book.title, book.author)
-            
-            if pdf_url:
-                pdf_path = finder.download_pdf(pdf_url, f"book_{book.id}.pdf")
-                
-                if pdf_path:
-                    pdf_qa = get_pdf_qa_service()
-                    success = pdf_qa.build_index(book.id, pdf_path)
-                    
-                    if success:
-                        book.is_indexed = True
-                        book.save()
-                        os.unlink(pdf_path)
-                        
-                        return Response({
-                            'book_id': book.id,
-                            'title': book.title,
-                            'author': book.author,
-                            'status': 'ready',
-                            'message': f'✅ {book.title} is ready! PDF found and analyzed.',
-                            'is_indexed': True
-                        })
-        except Exception as search_error:
-            print(f"PDF search error: {search_error}")
-        
-        # Return book info for manual PDF upload
+        # Search for a free PDF in the background
+        from books.services.indexing_jobs import enqueue_search
+        job = enqueue_search(book)
+        
         return Response({
             'book_id': book.id,
             'title': book.title,
             'author': book.author,
-            'status': 'needs_pdf',
-            'message': f'📖 {book.title} recognized. Upload PDF to start asking questions.',
+            'status': 'searching',
+            'job_id': job.id,
+            'message': f'📖 {book.title} recognized. Looking for a free PDF; you can also upload one.',
             'is_indexed': False
         })
         
@@ -151,30 +113,27 @@ def upload_pdf(request):
             author = request.data.get('author', 'Unknown Author')
             book = Book.objects.create(title=title, author=author)
         
-        # Process PDF without saving permanently
-        import tempfile
+        # Hash while saving; identical bytes share one index
+        from books.services.document_store import active_job_for, attach_document
+        from books.services.indexing_jobs import enqueue_pdf, save_upload, supersede_jobs
+        pdf_path, sha256 = save_upload(pdf_file)
         
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            for chunk in pdf_file.chunks():
-                temp_file.write(chunk)
-            temp_pdf_path = temp_file.name
-        
-        # Build index from temporary file
-        pdf_qa = get_pdf_qa_service()
-        success = pdf_qa.build_index(book.id, temp_pdf_path)
-        
-        # Delete temporary file
-        os.unlink(temp_pdf_path)
-        
-        if success:
-            book.is_indexed = True
-            book.save()
+        # The upload replaces a search (or earlier upload) still pending for this book
+        supersede_jobs(book)
+        if attach_document(book, sha256):
+            # Index in the background; the PDF is deleted once indexed
+            job = enqueue_pdf(book, pdf_path)
+        else:
+            # Already indexed, or being indexed for another upload
+            os.unlink(pdf_path)
+            job = active_job_for(book.document)
         
         return Response({
             'book_id': book.id,
             'title': book.title,
-            'indexed': book.is_indexed
+            'indexed': book.is_indexed,
+            'status': job.state if job else 'done',
+            'job_id': job.id if job else None
         })
         
     except Exception as e:
@@ -190,23 +149,34 @@ def ask_question(request):
         if not book_id or not question:
             return Response({'error': 'book_id and question required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        book = Book.objects.get(id=book_id)
+        book = Book.objects.select_related('document').get(id=book_id)
         
-        # Get answer
-        pdf_qa = get_pdf_qa_service()
-        answer = pdf_qa.ask_question(book_id, question)
+        # Reuse an earlier answer to the same question when possible
+        from books.services.answer_cache import is_cacheable_answer, normalize_question
+        cached_chat, cache_match = get_answer_cache().lookup(book, question)
+        
+        if cached_chat:
+            answer = cached_chat.answer
+        else:
+            pdf_qa = get_pdf_qa_service()
+            answer = pdf_qa.ask_question(book.index_key, question)
         
         # Save chat
         chat = Chat.objects.create(
             book=book,
+            document_id=book.document_id,
             question=question,
-            answer=answer
+            normalized_question=normalize_question(question) if is_cacheable_answer(answer) else '',
+            answer=answer,
+            from_cache=cached_chat is not None
         )
         
         return Response({
             'question': question,
             'answer': answer,
-            'chat_id': chat.id
+            'chat_id': chat.id,
+            'cached': cached_chat is not None,
+            'cache_match': cache_match
         })
         
     except Book.DoesNotExist:
@@ -214,6 +184,96 @@ def ask_question(request):
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _sse_event(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@csrf_exempt
+async def ask_question_stream(request):
+    """Ask question about a book, streaming the answer as server-sent events.
+
+    Tokens are only flushed as they arrive when served through ASGI
+    (bookanalyzer.asgi); under WSGI the response is buffered.
+    """
+    if request.method == 'GET':
+        data = request.GET
+    elif request.method == 'POST':
+        try:
+            data = json.loads(request.body or b'{}')
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    else:
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    book_id = data.get('book_id')
+    question = data.get('question')
+    
+    if not book_id or not question:
+        return JsonResponse({'error': 'book_id and question required'}, status=400)
+    
+    try:
+        book = await Book.objects.select_related('document').aget(id=book_id)
+    except (Book.DoesNotExist, ValueError):
+        return JsonResponse({'error': 'Book not found'}, status=404)
+    
+    from books.services.answer_cache import is_cacheable_answer, normalize_question
+    
+    async def events():
+        cached_chat, cache_match = await sync_to_async(get_answer_cache().lookup)(book, question)
+        
+        error = None
+        if cached_chat:
+            answer = cached_chat.answer
+            yield _sse_event('token', {'text': answer})
+        else:
+            pdf_qa = await sync_to_async(get_pdf_qa_service)()
+            stream = pdf_qa.stream_answer(book.index_key, question)
+            # Each Gemini chunk is awaited on a worker thread so the event loop stays free
+            next_piece = sync_to_async(next, thread_sensitive=False)
+            pieces = []
+            while True:
+                try:
+                    piece = await next_piece(stream, None)
+                except Exception as e:
+                    error = f"Error: {str(e)}"
+                    break
+                if piece is None:
+                    break
+                pieces.append(piece)
+                yield _sse_event('token', {'text': piece})
+            answer = ''.join(pieces).strip()
+        
+        if error:
+            # A cut-off answer is kept in the history but never served from cache
+            answer = f"{answer}\n\n{error}".strip()
+        
+        # Save chat once the full answer is known
+        chat = await Chat.objects.acreate(
+            book=book,
+            document_id=book.document_id,
+            question=question,
+            normalized_question=normalize_question(question) if not error and is_cacheable_answer(answer) else '',
+            answer=answer,
+            from_cache=cached_chat is not None
+        )
+        
+        if error:
+            yield _sse_event('error', {'error': error, 'chat_id': chat.id})
+            return
+        
+        yield _sse_event('done', {
+            'question': question,
+            'answer': answer,
+            'chat_id': chat.id,
+            'cached': cached_chat is not None,
+            'cache_match': cache_match
+        })
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @api_view(['GET'])
 def get_books(request):
     """Get all books"""
@@ -274,8 +334,7 @@ def check_code_plagiarism(request):
         if not code:
             return Response({'error': 'No code provided'}, status=status.HTTP_400_BAD_REQUEST)
         
-        from books.services.ai_code_plagiarism_checker import AICodePlagiarismChecker
-        checker = AICodePlagiarismChecker()
+        checker = get_plagiarism_checker()
         
         result = checker.analyze_code(code)
         
@@ -292,8 +351,7 @@ def batch_check_plagiarism(request):
         if not code_snippets:
             return Response({'error': 'No code snippets provided'}, status=status.HTTP_400_BAD_REQUEST)
         
-        from books.services.ai_code_plagiarism_checker import AICodePlagiarismChecker
-        checker = AICodePlagiarismChecker()
+        checker = get_plagiarism_checker()
         
         result = checker.batch_analyze(code_snippets)
         
@@ -306,16 +364,31 @@ def batch_check_plagiarism(request):
 def get_book_status(request, book_id):
     """Get book indexing status"""
     try:
+        from books.services.document_store import active_job_for
+        from books.services.indexing_jobs import ensure_worker_pool, job_status
+        # Resumes queued jobs after a restart, even before the next upload
+        ensure_worker_pool()
+
         book = Book.objects.get(id=book_id)
-        chunks_path = f"media/indexes/book_{book_id}_chunks.pkl"
+        chunks_path = get_pdf_qa_service().find_chunks_path(book.index_key)
+        job = None
+        if book.document_id and not book.is_indexed:
+            # Deduplicated upload: report the job that indexes the shared document
+            job = active_job_for(book.document)
+        if job is None:
+            job = book.index_jobs.order_by('-created_at').first()
+        if job is None and book.document_id:
+            job = IndexJob.objects.filter(book__document=book.document_id).order_by('-created_at').first()
         
         return Response({
             'book_id': book.id,
             'title': book.title,
             'author': book.author,
             'is_indexed': book.is_indexed,
-            'chunks_file_exists': os.path.exists(chunks_path),
+            'chunks_file_exists': chunks_path is not None,
             'chunks_path': chunks_path,
+            'document': book.document.sha256 if book.document_id else None,
+            'job': job_status(job),
             'note': 'PDFs are processed and deleted - only text chunks stored'
         })
         
@@ -343,8 +416,30 @@ def clear_all_books(request):
         os.makedirs('media/covers', exist_ok=True)
         os.makedirs('media/pdfs', exist_ok=True)
         os.makedirs('media/indexes', exist_ok=True)
+
+        # Drop in-memory copies of the deleted indexes
+        from books.services.pdf_qa_service import index_cache
+        index_cache.clear()
         
         return Response({'message': f'Deleted {count} books and cleaned up files'})
         
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+def get_service_stats(request):
+    """Get in-process cache counters for capacity planning"""
+    from books.services.http_session import http_stats
+    from books.services.pdf_qa_service import index_cache
+    from books.services.registry import registry
+
+    return Response({
+        'services': registry.built(),
+        'index_cache': index_cache.stats(),
+        'http': http_stats(),
+        'answer_cache': get_answer_cache().stats(),
+        'code_analysis_cache': get_code_analysis_cache().stats(),
+        'answers_served_from_cache': Chat.objects.filter(from_cache=True).count(),
+        'answers_generated': Chat.objects.filter(from_cache=False).count()
+    })
@@ -0,0 +1,160 @@
+import re
+import zlib
+from collections import Counter
+from itertools import combinations
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# MOSS-style winnowing over the token stream of preprocess_file() output.
+# Any match of at least KGRAM_TOKENS + WINNOW_WINDOW - 1 tokens is guaranteed to
+# share a fingerprint; matches shorter than KGRAM_TOKENS are ignored as noise.
+KGRAM_TOKENS = 8
+WINNOW_WINDOW = 5
+# Fingerprints found in more than this share of files (boilerplate such as
+# `if __name__ == '__main__':`) say nothing about copying and are skipped ...
+MAX_DOCUMENT_FREQUENCY = 0.2
+# ... but only once they are in more files than this, so code copied within a
+# group of students still counts in a small class
+MIN_BOILERPLATE_FILES = 10
+
+TOKEN_PATTERN = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|[A-Za-z_][A-Za-z0-9_]*|\d+(?:\.\d+)?|\S')
+KEYWORDS = frozenset("""
+    and as assert async await break case catch char class const continue def default del do double elif else
+    enum except extends final finally float for from global if implements import in int interface is lambda
+    long new nonlocal not or pass private protected public raise return short static struct switch this throw
+    throws try void while with yield
+""".split())
+HASH_BASE = np.uint64(1000003)
+
+class Fingerprints(NamedTuple):
+    hashes: np.ndarray       # uint64 k-gram hash of each selected fingerprint
+    first_lines: np.ndarray  # line (1-based) where each fingerprint's k-gram starts
+    last_lines: np.ndarray   # ... and where it ends
+
+def tokenize(code: str) -> Tuple[List[str], List[int]]:
+    # Identifiers, numbers and string literals become placeholders so renaming
+    # variables or changing constants does not change the fingerprints
+    tokens, lines = [], []
+    for line_no, line in enumerate(code.splitlines(), 1):
+        for token in TOKEN_PATTERN.findall(line):
+            if token[0] in '"\'':
+                token = 'S'
+            elif token[0].isdigit():
+                token = 'N'
+            elif (token[0].isalpha() or token[0] == '_') and token not in KEYWORDS:
+                token = 'V'
+            tokens.append(token)
+            lines.append(line_no)
+    return tokens, lines
+
+def kgram_hashes(tokens: List[str], k: int = KGRAM_TOKENS) -> np.ndarray:
+    # Polynomial hash of every k consecutive tokens (uint64 arithmetic wraps around).
+    # crc32 instead of hash() keeps fingerprints stable across processes
+    if len(tokens) < k:
+        return np.zeros(0, dtype=np.uint64)
+    ids = np.array([zlib.crc32(token.encode('utf-8')) for token in tokens], dtype=np.uint64)
+    hashes = np.zeros(len(ids) - k + 1, dtype=np.uint64)
+    for offset in range(k):
+        hashes = hashes * HASH_BASE + ids[offset:offset + len(hashes)]
+    return hashes
+
+def winnow(hashes: np.ndarray, window: int = WINNOW_WINDOW) -> np.ndarray:
+    # Positions of the minimum hash in every window (rightmost on ties), each kept once
+    if len(hashes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if len(hashes) <= window:
+        return np.array([len(hashes) - 1 - np.argmin(hashes[::-1])])
+    windows = sliding_window_view(hashes, window)
+    rightmost = window - 1 - np.argmin(windows[:, ::-1], axis=1)
+    return np.unique(np.arange(len(windows)) + rightmost)
+
+def fingerprint(code: str, k: int = KGRAM_TOKENS, window: int = WINNOW_WINDOW) -> Fingerprints:
+    tokens, lines = tokenize(code)
+    hashes = kgram_hashes(tokens, k)
+    positions = winnow(hashes, window)
+    lines = np.array(lines, dtype=np.int64)
+    return Fingerprints(hashes[positions], lines[positions], lines[positions + k - 1] if len(positions) else lines[:0])
+
+def merge_ranges(first_lines: np.ndarray, last_lines: np.ndarray) -> List[Tuple[int, int]]:
+    # Overlapping or adjacent line spans merged into (start, end) ranges
+    ranges: List[Tuple[int, int]] = []
+    for start, end in sorted(zip(first_lines.tolist(), last_lines.tolist())):
+        if ranges and start <= ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((start, end))
+    return ranges
+
+def format_ranges(ranges: List[Tuple[int, int]]) -> str:
+    return ', '.join(f'{start}-{end}' if end != start else str(start) for start, end in ranges)
+
+class FingerprintIndex:
+    # Inverted index from fingerprint hash to the files containing it. Candidate
+    # pairs come from walking the posting lists, so cost grows with the number
+    # of shared fingerprints rather than with the number of file pairs
+    def __init__(self, k: int = KGRAM_TOKENS, window: int = WINNOW_WINDOW,
+                 max_document_frequency: float = MAX_DOCUMENT_FREQUENCY,
+                 min_boilerplate_files: int = MIN_BOILERPLATE_FILES):
+        self.k = k
+        self.window = window
+        self.max_document_frequency = max_document_frequency
+        self.min_boilerplate_files = min_boilerplate_files
+        self.boilerplate: set = set()
+        self.documents: List[Fingerprints] = []
+        self.distinct: List[np.ndarray] = []
+        self.postings: Dict[int, List[int]] = {}
+
+    def add(self, code: str) -> int:
+        # Index one preprocessed file; returns its id (files are numbered in the order added)
+        doc_id = len(self.documents)
+        prints = fingerprint(code, self.k, self.window)
+        self.documents.append(prints)
+        self.distinct.append(np.unique(prints.hashes))
+        for h in self.distinct[-1].tolist():
+            self.postings.setdefault(h, []).append(doc_id)
+        return doc_id
+
+    def add_boilerplate(self, code: str) -> None:
+        # Fingerprints of code every file may contain (e.g. provided starter code) never count
+        self.boilerplate.update(fingerprint(code, self.k, self.window).hashes.tolist())
+
+    def _max_postings(self) -> int:
+        return max(self.min_boilerplate_files, int(self.max_document_frequency * len(self.documents)))
+
+    def _significant(self, h: int, limit: int) -> bool:
+        return h not in self.boilerplate and len(self.postings[h]) <= limit
+
+    def _shared(self, i: int, j: int) -> np.ndarray:
+        shared = np.intersect1d(self.distinct[i], self.distinct[j], assume_unique=True)
+        limit = self._max_postings()
+        return np.array([h for h in shared.tolist() if self._significant(h, limit)], dtype=np.uint64)
+
+    def _overlap(self, shared: int, i: int, j: int) -> float:
+        # Share of the smaller file's fingerprints also found in the other file
+        smaller = min(len(self.distinct[i]), len(self.distinct[j]))
+        return shared / smaller if smaller else 0.0
+
+    def similarity(self, i: int, j: int) -> float:
+        return self._overlap(len(self._shared(i, j)), i, j)
+
+    def candidate_pairs(self, threshold: float) -> List[Tuple[int, int, float]]:
+        # (i, j, overlap) for files i < j whose fingerprint overlap reaches threshold
+        limit = self._max_postings()
+        counts: Counter = Counter()
+        for h, docs in self.postings.items():
+            if len(docs) >= 2 and self._significant(h, limit):
+                counts.update(combinations(docs, 2))
+        pairs = [(i, j, self._overlap(shared, i, j)) for (i, j), shared in counts.items()]
+        return sorted(pair for pair in pairs if pair[2] >= threshold)
+
+    def matching_lines(self, i: int, j: int) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        # Line ranges of each file covered by fingerprints the two files share
+        shared = self._shared(i, j)
+        ranges = []
+        for doc_id in (i, j):
+            prints = self.documents[doc_id]
+            mask = np.isin(prints.hashes, shared)
+            ranges.append(merge_ranges(prints.first_lines[mask], prints.last_lines[mask]))
+        return ranges[0], ranges[1]
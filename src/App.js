@@ -25,6 +25,30 @@ function App() {
     }
   };
 
+  // Poll indexing job until the book is ready (indexing runs in the background)
+  const waitForIndexing = async (bookId) => {
+    while (true) {
+      const response = await axios.get(`${API_BASE}/${bookId}/`);
+      const job = response.data.job;
+      
+      if (response.data.is_indexed) {
+        return response.data;
+      }
+      if (!job || job.state === 'failed') {
+        throw new Error(job ? job.error : 'No indexing job found');
+      }
+      if (job.state === 'done') {
+        // Finished without indexing this book; nothing more will happen
+        throw new Error(job.error || 'Indexing finished without an index');
+      }
+      
+      if (job.pages_total) {
+        setUploadStatus(`📄 Indexing PDF... ${job.pages_done}/${job.pages_total} pages`);
+      }
+      await new Promise(resolve => setTimeout(resolve, 2000));
+    }
+  };
+
   // Upload cover image - complete workflow
   const uploadCover = async (file) => {
     setLoading(true);
@@ -41,8 +65,18 @@ function App() {
         setUploadStatus(response.data.message);
         setSelectedBook(response.data);
       } else {
-        // Need manual PDF upload
+        // PDF search runs in the background; manual upload still possible
         setUploadStatus(response.data.message);
+        
+        waitForIndexing(response.data.book_id)
+          .then(book => {
+            setUploadStatus(`✅ ${book.title} is ready! PDF found and analyzed.`);
+            setSelectedBook(book);
+            fetchBooks();
+          })
+          .catch(() => {
+            setUploadStatus(`📖 ${response.data.title} recognized. Upload PDF to start asking questions.`);
+          });
       }
       
       fetchBooks();
@@ -64,12 +98,11 @@ function App() {
     
     try {
       const response = await axios.post(`${API_BASE}/upload-pdf/`, formData);
+      const book = await waitForIndexing(response.data.book_id);
       setUploadStatus('✅ PDF analyzed! Ready for questions.');
       
       // Auto-select the processed book
-      if (response.data.indexed) {
-        setSelectedBook(response.data);
-      }
+      setSelectedBook(book);
       
       fetchBooks();
     } catch (error) {
@@ -79,24 +112,54 @@ function App() {
     setLoading(false);
   };
 
-  // Ask question
+  // Ask question - answer streams in as it is generated
   const askQuestion = async () => {
     if (!selectedBook || !question.trim()) return;
     
     setLoading(true);
+    const asked = question;
+    setChatHistory(prev => [...prev, { question: asked, answer: '' }]);
+    setQuestion('');
+    
+    const appendToAnswer = (text) => {
+      setChatHistory(prev => {
+        const last = prev[prev.length - 1];
+        return [...prev.slice(0, -1), { ...last, answer: last.answer + text }];
+      });
+    };
     
     try {
-      const response = await axios.post(`${API_BASE}/ask-question/`, {
-        book_id: selectedBook.book_id || selectedBook.id,
-        question: question
+      const response = await fetch(`${API_BASE}/ask-question/stream/`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          book_id: selectedBook.book_id || selectedBook.id,
+          question: asked
+        })
       });
       
-      setChatHistory(prev => [...prev, {
-        question: question,
-        answer: response.data.answer
-      }]);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
       
-      setQuestion('');
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        
+        for (const event of events) {
+          const type = event.match(/^event: (.*)$/m)?.[1];
+          const data = event.match(/^data: (.*)$/m)?.[1];
+          if (type === 'token' && data) {
+            appendToAnswer(JSON.parse(data).text);
+          } else if (type === 'error' && data) {
+            appendToAnswer(`\n\n❌ ${JSON.parse(data).error}`);
+          }
+        }
+      }
     } catch (error) {
       console.error('Error asking question:', error);
     }